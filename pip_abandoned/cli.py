@@ -1,11 +1,56 @@
 import argparse
 import textwrap
+from datetime import datetime, timezone
 from pathlib import Path
 
 from . import lib
 from .__version__ import __version__
 
 
+def shard(value):
+    try:
+        index, count = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: '{value}'. Expected i/N")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"invalid shard: '{value}'. Expected 1 <= i <= N"
+        )
+    return index, count
+
+
+def positive_int(value):
+    try:
+        value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: '{value}'")
+    return value
+
+
+def regex(value):
+    # Compile the pattern the same way it will be used,
+    # combined with the other patterns
+    try:
+        lib.compile_deprecation_patterns({value: value})
+    except Exception as e:
+        raise argparse.ArgumentTypeError(f"invalid regex: '{value}' ({e})")
+    return value
+
+
+def timestamp(value):
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid date: '{value}'. Expected YYYY-MM-DD"
+        )
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
 def get_parser():
     parser = argparse.ArgumentParser(
         description="Search for abandoned and deprecated python packages",
@@ -24,6 +69,8 @@ def get_parser():
             Examples:
             pip-abandoned search myproject/lib/python3.10/site-packages
             pip-abandoned search -r requirements.txt
+            pip-abandoned search --wheelhouse ./wheels
+            pip-abandoned search --shard 1/4 --format json myproject/lib/python3.10/site-packages
         """),
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
@@ -44,6 +91,12 @@ def get_parser():
         dest="requirements",
         help="Install packages from the given requirements file into a temporary virtualenv. Then search that virtualenv. This option can be used multiple times.",
     )
+    dep_source_args.add_argument(
+        "--wheelhouse",
+        type=Path,
+        metavar="DIR",
+        help="Search the wheels and sdists in the given directory (e.g: a wheelhouse or pip cache) without installing them",
+    )
 
     search.add_argument(
         "-v",
@@ -54,36 +107,321 @@ def get_parser():
     )
     search.add_argument(
         "--format",
-        choices=["text", "json"],
+        choices=["text", "json", "csv", "tsv"],
+        default="text",
+        help="Output format. If stdout is not a terminal, text output is written without any formatting",
+    )
+    search.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache the status of GitHub repos between runs. Cached repos are revalidated with conditional requests, which don't count against the GitHub API rate limit if nothing has changed. The first revalidation of a repo is a normal request, because the GraphQL API doesn't return an ETag.",
+    )
+    search.add_argument(
+        "--revalidate",
+        choices=["etag", "nodes"],
+        default="etag",
+        help="How to revalidate cached repos when using --cache. 'etag' makes a conditional REST request for each repo, which is free if the repo hasn't changed. 'nodes' looks up up to 100 repos at a time by their GraphQL node ID, which also follows renamed and transferred repos. Default: etag",
+    )
+    search.add_argument(
+        "--shard",
+        type=shard,
+        metavar="i/N",
+        help="Split the packages into N shards and only search shard i. See also: pip-abandoned plan",
+    )
+    search.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop searching as soon as one abandoned or deprecated package is found. Only the packages found before stopping are reported.",
+    )
+    search.add_argument(
+        "--repo-index",
+        type=Path,
+        metavar="PATH",
+        help="Use this repo index instead of the one shipped with pip-abandoned. See also: pip-abandoned build-index",
+    )
+    search.add_argument(
+        "--deprecation-pattern",
+        type=regex,
+        metavar="REGEX",
+        action="append",
+        dest="deprecation_patterns",
+        help="Also treat packages whose description matches the given regex (case-insensitive) as unmaintained. This option can be used multiple times.",
+    )
+
+    search.add_argument(
+        "--history-db",
+        type=Path,
+        metavar="PATH",
+        help="Record the results of this search in a SQLite database. Can't be used with --fail-fast. See also: pip-abandoned history",
+    )
+    search.add_argument(
+        "--environment",
+        metavar="NAME",
+        help="Name to record this search under in the history database. Defaults to the path searched. When using --shard, the shard is added to the name",
+    )
+
+    plan = subparsers.add_parser(
+        "plan",
+        help="Show how the packages in a virtualenv will be split into shards",
+        epilog=textwrap.dedent("""\
+            Examples:
+            pip-abandoned plan --shards 4 myproject/lib/python3.10/site-packages
+            pip-abandoned plan --shards 4 --wheelhouse ./wheels
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    plan_source_args = plan.add_mutually_exclusive_group(required=True)
+    plan_source_args.add_argument(
+        "path", type=Path, nargs="?", help="Path to a virtualenv to search"
+    )
+    plan_source_args.add_argument(
+        "--wheelhouse",
+        type=Path,
+        metavar="DIR",
+        help="Path to a directory of wheels and sdists to search",
+    )
+    plan.add_argument(
+        "-n",
+        "--shards",
+        type=positive_int,
+        required=True,
+        help="Number of shards",
+    )
+    plan.add_argument(
+        "--repo-index",
+        type=Path,
+        metavar="PATH",
+        help="Use this repo index instead of the one shipped with pip-abandoned. See also: pip-abandoned build-index",
+    )
+    plan.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Increase output verbosity",
+    )
+
+    merge = subparsers.add_parser(
+        "merge",
+        help="Merge JSON output from several searches into a single report",
+        epilog=textwrap.dedent("""\
+            Examples:
+            pip-abandoned merge shard-1.json shard-2.json shard-3.json shard-4.json
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    merge.add_argument(
+        "reports",
+        type=argparse.FileType("r"),
+        nargs="+",
+        metavar="REPORT",
+        help="Output from pip-abandoned search --format json",
+    )
+
+    history = subparsers.add_parser(
+        "history",
+        help="Query the results of previous searches recorded with --history-db",
+        epilog=textwrap.dedent("""\
+            Examples:
+            pip-abandoned history results.db --package commonmark --signal archived
+            pip-abandoned history results.db --since 2026-01-01
+            pip-abandoned history results.db --environment "my-service (shard 4/4)" --forget
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    history.add_argument("path", type=Path, help="Path to a history database")
+    history.add_argument("--package", help="Only show findings for this package")
+    history.add_argument(
+        "--repo", help="Only show findings for this GitHub repo (URL or owner/name)"
+    )
+    history.add_argument(
+        "--environment", help="Only show findings for this environment"
+    )
+    history.add_argument(
+        "--signal",
+        choices=["inactive", "unmaintained", "archived"],
+        help="Only show findings of this type",
+    )
+    history.add_argument(
+        "--since",
+        type=timestamp,
+        metavar="DATE",
+        help="Show packages which were first found on or after this date, instead of the findings from the latest search of each environment",
+    )
+    history.add_argument(
+        "--format",
+        choices=["text", "json", "csv", "tsv"],
         default="text",
-        help="Output format",
+        help="Output format. If stdout is not a terminal, text output is written without any formatting",
+    )
+    history.add_argument(
+        "--forget",
+        action="store_true",
+        help="Remove every search of the environment given with --environment from the database, instead of showing findings. e.g: to remove shards which no longer exist",
     )
 
-    set_token = subparsers.add_parser(  # noqa: F841
-        "set-token", help="Set a GitHub API token"
+    build_index = subparsers.add_parser(
+        "build-index",
+        help="Build an index of package names to GitHub repos",
+        description="Build an index of package names to GitHub repos. This is used to find the repo for packages whose metadata doesn't link to exactly one GitHub repo.",
+        epilog=textwrap.dedent("""\
+            Examples:
+            pip-abandoned build-index -o repo-index.txt --history-db results.db
+            pip-abandoned build-index -o repo-index.txt --wheelhouse ./wheels
+            pip-abandoned search --repo-index repo-index.txt myproject/lib/python3.10/site-packages
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    build_index.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        required=True,
+        help="Path to write the index to",
+    )
+    build_index.add_argument(
+        "--history-db",
+        type=Path,
+        metavar="PATH",
+        action="append",
+        dest="history_paths",
+        default=[],
+        help="Read repos from a history database. This option can be used multiple times.",
+    )
+    build_index.add_argument(
+        "--path",
+        type=Path,
+        action="append",
+        dest="paths",
+        default=[],
+        help="Read repos from the package metadata in a virtualenv. This option can be used multiple times.",
+    )
+    build_index.add_argument(
+        "--wheelhouse",
+        type=Path,
+        metavar="DIR",
+        action="append",
+        dest="wheelhouses",
+        default=[],
+        help="Read repos from the package metadata in a directory of wheels and sdists. This option can be used multiple times.",
+    )
+    build_index.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Increase output verbosity",
+    )
+
+    set_token = subparsers.add_parser("set-token", help="Set a GitHub API token")
+    set_token.add_argument(
+        "--add",
+        action="store_true",
+        help="Store this token in addition to any tokens already set, instead of replacing them. Requests will be spread across all the stored tokens.",
     )
 
     return parser
 
 
+def get_deprecation_patterns(args):
+    if not args.deprecation_patterns:
+        return None
+    return {pattern: pattern for pattern in args.deprecation_patterns}
+
+
+def get_environment(args):
+    if args.environment:
+        return args.environment
+    if args.requirements:
+        return ",".join(req.name for req in args.requirements)
+    return str(args.path or args.wheelhouse)
+
+
+def get_search_options(args):
+    return {
+        "cache_path": lib.get_cache_path() if args.cache else None,
+        "shard": args.shard,
+        "fail_fast": args.fail_fast,
+        "deprecation_patterns": get_deprecation_patterns(args),
+        "history_path": args.history_db,
+        "environment": get_environment(args),
+        "revalidate": args.revalidate,
+        "repo_index_path": args.repo_index,
+    }
+
+
 def cli():
     parser = get_parser()
 
     args = parser.parse_args()
 
+    if args.subcommand == "search" and args.history_db and args.fail_fast:
+        # fail fast only finds some of the packages, so it isn't a complete
+        # record of the environment
+        parser.error("search: --history-db can't be used with --fail-fast")
+
     if args.subcommand == "search" and args.path:
         return lib.search_virtualenv_path(
-            lib.get_token(), args.path, args.verbose, args.format
+            lib.get_token_pool(),
+            args.path,
+            args.verbose,
+            args.format,
+            **get_search_options(args),
         )
     elif args.subcommand == "search" and args.requirements:
         return lib.search_requirements_files(
-            lib.get_token(),
+            lib.get_token_pool(),
             [Path(req.name) for req in args.requirements],
             args.verbose,
             args.format,
+            **get_search_options(args),
+        )
+    elif args.subcommand == "search" and args.wheelhouse:
+        return lib.search_wheelhouse(
+            lib.get_token_pool(),
+            args.wheelhouse,
+            args.verbose,
+            args.format,
+            **get_search_options(args),
+        )
+    elif args.subcommand == "plan" and args.path:
+        return lib.plan_virtualenv_path(
+            args.path, args.shards, args.verbose, args.repo_index
+        )
+    elif args.subcommand == "plan" and args.wheelhouse:
+        return lib.plan_wheelhouse(
+            args.wheelhouse, args.shards, args.verbose, args.repo_index
+        )
+    elif args.subcommand == "history" and args.forget:
+        if not args.environment:
+            parser.error("history: --forget requires --environment")
+        return lib.forget_history(args.path, args.environment)
+    elif args.subcommand == "history":
+        return lib.search_history(
+            args.path,
+            args.format,
+            since=args.since,
+            package=args.package,
+            repo=args.repo,
+            environment=args.environment,
+            signal=args.signal,
+        )
+    elif args.subcommand == "build-index":
+        if not (args.history_paths or args.paths or args.wheelhouses):
+            parser.error(
+                "build-index: at least one of --history-db, --path or --wheelhouse is required"
+            )
+        return lib.build_repo_index(
+            args.output,
+            args.history_paths,
+            args.paths,
+            args.wheelhouses,
+            args.verbose,
         )
+    elif args.subcommand == "merge":
+        return lib.merge_json_files(args.reports)
     elif args.subcommand == "set-token":
-        return lib.set_token()
+        return lib.set_token(args.add)
     else:
         parser.print_help()
         return 0
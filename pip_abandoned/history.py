@@ -0,0 +1,126 @@
+import sqlite3
+from datetime import datetime, timezone
+from importlib.metadata import Prepared
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    environment TEXT NOT NULL,
+    scanned_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scans_environment ON scans (environment, scanned_at);
+CREATE INDEX IF NOT EXISTS scans_scanned_at ON scans (scanned_at);
+
+CREATE TABLE IF NOT EXISTS findings (
+    scan_id INTEGER NOT NULL REFERENCES scans (id),
+    package TEXT NOT NULL,
+    package_key TEXT NOT NULL,
+    repo TEXT,
+    signal TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS findings_scan_id ON findings (scan_id);
+CREATE INDEX IF NOT EXISTS findings_package_key ON findings (package_key, signal);
+CREATE INDEX IF NOT EXISTS findings_repo ON findings (repo);
+"""
+
+# Columns returned by get_current_findings and get_new_findings
+CURRENT_FINDINGS_COLUMNS = ["environment", "scanned_at", "package", "repo", "signal"]
+NEW_FINDINGS_COLUMNS = ["package", "repo", "signal", "first_seen"]
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def open_db(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_scan(conn, environment, findings, scanned_at=None):
+    # findings is an iterable of (package, repo, signal)
+    # All the findings from one scan are written in a single transaction
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO scans (environment, scanned_at) VALUES (?, ?)",
+            (environment, scanned_at or now()),
+        )
+        conn.executemany(
+            "INSERT INTO findings (scan_id, package, package_key, repo, signal) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (cursor.lastrowid, package, Prepared.normalize(package), repo, signal)
+                for package, repo, signal in findings
+            ],
+        )
+    return cursor.lastrowid
+
+
+def get_filters(package=None, repo=None, environment=None, signal=None):
+    clauses = []
+    params = []
+    if package:
+        clauses.append("f.package_key = ?")
+        params.append(Prepared.normalize(package))
+    if repo:
+        clauses.append("f.repo = ?")
+        params.append(repo)
+    if environment:
+        clauses.append("s.environment = ?")
+        params.append(environment)
+    if signal:
+        clauses.append("f.signal = ?")
+        params.append(signal)
+    return clauses, params
+
+
+def get_current_findings(conn, **filters):
+    # Findings from the most recent scan of each environment
+    clauses, params = get_filters(**filters)
+    clauses.insert(0, "s.id IN (SELECT MAX(id) FROM scans GROUP BY environment)")
+    return conn.execute(
+        "SELECT s.environment, s.scanned_at, f.package, f.repo, f.signal "
+        "FROM findings f JOIN scans s ON s.id = f.scan_id "
+        f"WHERE {' AND '.join(clauses)} "
+        "ORDER BY s.environment, f.package_key, f.signal",
+        params,
+    ).fetchall()
+
+
+def get_new_findings(conn, since, **filters):
+    # Packages which were first found with a given signal on or after `since`
+    clauses, params = get_filters(**filters)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    return conn.execute(
+        "SELECT f.package, f.repo, f.signal, MIN(s.scanned_at) AS first_seen "
+        "FROM findings f JOIN scans s ON s.id = f.scan_id "
+        f"{where}"
+        "GROUP BY f.package_key, f.signal "
+        "HAVING first_seen >= ? "
+        "ORDER BY first_seen, f.package_key, f.signal",
+        [*params, since],
+    ).fetchall()
+
+
+def forget_environment(conn, environment):
+    # Remove every scan of an environment, e.g: a shard which no longer exists
+    with conn:
+        conn.execute(
+            "DELETE FROM findings "
+            "WHERE scan_id IN (SELECT id FROM scans WHERE environment = ?)",
+            (environment,),
+        )
+        cursor = conn.execute("DELETE FROM scans WHERE environment = ?", (environment,))
+    return cursor.rowcount
+
+
+def get_package_repos(conn):
+    # The most recently seen repo for each package
+    rows = conn.execute(
+        "SELECT f.package, f.repo FROM findings f JOIN scans s ON s.id = f.scan_id "
+        "WHERE f.repo IS NOT NULL "
+        "ORDER BY s.scanned_at, s.id"
+    ).fetchall()
+    return {Prepared.normalize(package): repo for package, repo in rows}
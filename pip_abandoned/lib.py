@@ -1,24 +1,89 @@
+import csv
 import json
 import logging
+import math
 import os
+import queue
+import re
+import sqlite3
 import subprocess
 import sys
+import tarfile
+import threading
+import time
 import venv
-from importlib.metadata import Prepared, distributions
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from datetime import datetime
+from importlib.metadata import Distribution, Prepared, distributions
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from urllib.parse import urlparse, urlunparse
 
 import keyring
 import requests
-from rich import print_json
+from requests.adapters import HTTPAdapter
 from rich.console import Console
 from rich.logging import RichHandler
+from rich.markup import escape
 from rich.table import Table
+from rich.text import Text
+
+from . import history
+from .repo_index import RepoIndex, bundled_repo_index, write_repo_index
 
 # Number of GitHub repos to query in a single API request
 DEFAULT_CHUNK_SIZE = 200
 
+# Max number of chunks of GitHub repos waiting to be queried
+# while we read more package metadata
+DEFAULT_QUEUE_SIZE = 4
+
+# Number of GitHub repos to look up by node ID in a single API request.
+# This is the maximum the GitHub API allows
+DEFAULT_NODES_CHUNK_SIZE = 100
+
+# Number of concurrent requests to make when revalidating cached repos,
+# and number of archives to read concurrently when searching a wheelhouse
+DEFAULT_MAX_WORKERS = 16
+
+# Wheels and sdists we know how to read metadata from
+ARCHIVE_SUFFIXES = (".whl", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+
+# Patterns which indicate a package is no longer maintained
+# if they are found in the package description
+DEPRECATION_PATTERNS = {
+    "[maintained|no] badge": r"//img\.shields\.io/maintenance/no",
+    "unmaintained badge": (
+        r"//(?:img\.shields\.io|(?:flat\.)?badgen\.net)/badge/"
+        r"(?:maintained[-/]no|maintenance[-/]no|status[-/](?:unmaintained|deprecated|abandoned))\b"
+    ),
+    "repostatus badge": (
+        r"//(?:www\.)?repostatus\.org/badges/latest/(?:abandoned|inactive|moved|unsupported)"
+    ),
+    # The phrases must be about the package itself, not e.g: a branch or a fork
+    "no longer maintained": (
+        r"\bthis (?:project|package|library|repo(?:sitory)?) is "
+        r"(?:deprecated and )?no longer (?:actively )?maintained\b"
+    ),
+    "deprecated notice": (
+        r"\bthis (?:project|package|library|repo(?:sitory)?) (?:is|has been) deprecated\b"
+    ),
+    # moved to a URL, a repo (owner/name) or a named package
+    "moved notice": (
+        r"\bthis (?:project|package|library|repo(?:sitory)?) has (?:been )?moved to "
+        r"(?:\[[^\]]*\]\()?(?:https?://|`?[\w.-]+/[\w.-]+"
+        r"|(?:the )?`?[\w.-]+`? (?:project|package|library|repo(?:sitory)?)\b)"
+    ),
+}
+
+# Global inline flags at the start of a regex e.g: (?i)
+INLINE_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+# Numbered backreferences e.g: \1 or (?(1)...), which aren't escaped
+NUMBERED_BACKREFERENCE = re.compile(r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?\(\d)")
+
 logging.basicConfig(
     format="%(message)s",
     handlers=[RichHandler(show_time=False, console=Console(stderr=True))],
@@ -28,11 +93,119 @@ logger = logging.getLogger(__name__)
 console = Console()
 
 
-def get_token():
-    if gh_token := os.environ.get("GH_TOKEN"):
-        return gh_token
-    if gh_token := keyring.get_password("pip-abandoned", "gh_token"):
+class TokenPool:
+    # Spread requests across one or more GitHub API tokens.
+    # Each request uses the token with the most remaining rate limit budget.
+    # A token which has used up its budget is not used again until it resets.
+    # GitHub has separate budgets for each API (e.g: graphql and core),
+    # so budgets are tracked for each (token, resource)
+
+    def __init__(self, tokens):
+        self.tokens = list(dict.fromkeys(tokens))
+        self.remaining = {}
+        self.reset_at = {}
+        self.lock = threading.Lock()
+
+    def get_budget(self, token, resource, now):
+        remaining = self.remaining.get((token, resource))
+        if remaining is None or self.reset_at[(token, resource)] <= now:
+            # We don't know yet, or the rate limit has been reset since we last checked
+            return math.inf
+        return remaining
+
+    def acquire(self, resource="core"):
+        with self.lock:
+            now = time.time()
+            token = max(
+                self.tokens, key=lambda token: self.get_budget(token, resource, now)
+            )
+            if self.get_budget(token, resource, now) <= 0:
+                reset_at = datetime.fromtimestamp(
+                    min(self.reset_at[(token, resource)] for token in self.tokens)
+                )
+                raise Exception(
+                    f"GitHub API rate limit exceeded for all tokens. Try again after {reset_at:%H:%M:%S}"
+                )
+            if self.get_budget(token, resource, now) != math.inf:
+                # Reserve one request's worth of budget so concurrent
+                # requests are spread across the other tokens
+                self.remaining[(token, resource)] -= 1
+            return token
+
+    def update(self, token, headers, resource="core"):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_at = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset_at is None:
+            return
+        # Trust GitHub about which budget this response counted against
+        resource = headers.get("X-RateLimit-Resource", resource)
+        with self.lock:
+            self.remaining[(token, resource)] = int(remaining)
+            self.reset_at[(token, resource)] = int(reset_at)
+
+
+def as_token_pool(gh_token):
+    if isinstance(gh_token, TokenPool):
         return gh_token
+    return TokenPool([gh_token])
+
+
+def get_rate_limit_resource(url):
+    return "graphql" if urlparse(url).path == "/graphql" else "core"
+
+
+def is_rate_limited(resp):
+    if resp.headers.get("X-RateLimit-Remaining") != "0":
+        return False
+    if resp.status_code in (403, 429):
+        return True
+    # The GraphQL API reports an exhausted rate limit as an error in a 200 response
+    try:
+        errors = resp.json().get("errors") or []
+    except (ValueError, AttributeError):
+        return False
+    return any(error.get("type") == "RATE_LIMITED" for error in errors)
+
+
+def github_request(gh_token, method, url, session=None, headers=None, **kwargs):
+    pool = as_token_pool(gh_token)
+    resource = get_rate_limit_resource(url)
+    # If a token turns out to be exhausted, retry with the next best one
+    for _ in range(len(pool.tokens)):
+        token = pool.acquire(resource)
+        resp = (session or requests).request(
+            method,
+            url,
+            headers={**(headers or {}), "Authorization": f"token {token}"},
+            **kwargs,
+        )
+        pool.update(token, resp.headers, resource)
+        if not is_rate_limited(resp):
+            break
+        logger.warning("GitHub API rate limit exceeded for token. Rotating")
+    return resp
+
+
+def get_keyring_username(i):
+    return "gh_token" if i == 0 else f"gh_token_{i + 1}"
+
+
+def get_keyring_tokens():
+    tokens = []
+    while token := keyring.get_password(
+        "pip-abandoned", get_keyring_username(len(tokens))
+    ):
+        tokens.append(token)
+    return tokens
+
+
+def get_tokens():
+    if gh_tokens := os.environ.get("GH_TOKEN"):
+        gh_tokens = [token.strip() for token in gh_tokens.split(",") if token.strip()]
+    else:
+        gh_tokens = get_keyring_tokens()
+    if gh_tokens:
+        return gh_tokens
     raise Exception(
         "No GitHub token supplied.\n"
         "Provide one via the GH_TOKEN environment variable or set one by running\n"
@@ -43,26 +216,40 @@ def get_token():
     )
 
 
-def set_token():
+def get_token_pool():
+    return TokenPool(get_tokens())
+
+
+def set_token(add=False):
     console.print(
         "In order to efficiently query the GitHub API, a GitHub API token is required. "
         "A Personal Access Token with read-only access to public repos will be sufficient for most cases. "
         "Your token will be stored using the system keyring service.\n"
     )
     gh_token = input("GitHub API token: ")
-    keyring.set_password("pip-abandoned", "gh_token", gh_token)
+    count = len(get_keyring_tokens())
+    if add:
+        keyring.set_password("pip-abandoned", get_keyring_username(count), gh_token)
+        return 0
+
+    # Replace all the stored tokens with this one
+    keyring.set_password("pip-abandoned", get_keyring_username(0), gh_token)
+    for i in range(1, count):
+        keyring.delete_password("pip-abandoned", get_keyring_username(i))
     return 0
 
 
 def set_log_level(verbosity):
+    # Set the level for every module in the package, not just this one
+    package_logger = logging.getLogger(__package__)
     if verbosity == 0:
-        logger.setLevel(logging.ERROR)
+        package_logger.setLevel(logging.ERROR)
     elif verbosity == 1:
-        logger.setLevel(logging.WARNING)
+        package_logger.setLevel(logging.WARNING)
     elif verbosity == 2:
-        logger.setLevel(logging.INFO)
+        package_logger.setLevel(logging.INFO)
     elif verbosity >= 3:
-        logger.setLevel(logging.DEBUG)
+        package_logger.setLevel(logging.DEBUG)
 
 
 def get_python_version():
@@ -112,7 +299,7 @@ def strip_suffixes(url):
     return url
 
 
-def get_github_repo_url(distribution):
+def get_candidate_repo_urls(distribution):
     urls = set()
 
     if home_page := github_repo_url_or_none(distribution.metadata.get("Home-page")):
@@ -127,14 +314,36 @@ def get_github_repo_url(distribution):
             except ValueError:
                 pass
 
-    urls = list(urls)
+    return sorted(urls)
 
-    if len(urls) > 1:
-        logger.warning(
-            f"Found multiple candidate GitHub repo URLs for package {distribution.metadata.get('name')}: {', '.join(urls)}. Skipping"
-        )
+
+def get_github_repo_url(distribution, index=None):
+    # If the package metadata doesn't point at exactly one repo,
+    # fall back to the repo index to find one or break the tie
+    if index is None:
+        index = bundled_repo_index
+
+    urls = get_candidate_repo_urls(distribution)
     if len(urls) == 1:
         return urls[0]
+
+    name = distribution.metadata.get("name")
+    indexed_repo = index.lookup(name) if name else None
+
+    if len(urls) == 0:
+        if indexed_repo:
+            logger.info(f"Using repo index for package {name}: {indexed_repo}")
+            return f"https://github.com/{indexed_repo}"
+        return None
+
+    for url in urls:
+        if indexed_repo and get_cache_key(url) == indexed_repo.lower():
+            logger.info(f"Using repo index to choose repo for package {name}: {url}")
+            return url
+
+    logger.warning(
+        f"Found multiple candidate GitHub repo URLs for package {name}: {', '.join(urls)}. Skipping"
+    )
     return None
 
 
@@ -142,14 +351,17 @@ def normalize_name(name):
     return f"_{Prepared.normalize(name)}"
 
 
+def get_owner_and_name(repo):
+    owner, name = [part for part in urlparse(repo).path.split("/") if part]
+    return owner, name
+
+
 def get_graphql_query(dist_urls):
     query = "query {\n"
     for dist, repo in dist_urls:
-        owner, name = [part for part in urlparse(repo).path.split("/") if part]
+        owner, name = get_owner_and_name(repo)
         slug = normalize_name(dist.name)
-        query += (
-            f'  {slug}: repository(owner: "{owner}", name: "{name}") {{ isArchived }}\n'
-        )
+        query += f'  {slug}: repository(owner: "{owner}", name: "{name}") {{ id isArchived }}\n'
     query += "}"
     return query
 
@@ -164,6 +376,24 @@ def get_graphql_queries(dist_urls, chunk_size=None):
     return queries
 
 
+def get_nodes_query(ids):
+    # Node IDs are stable if a repo is renamed or transferred
+    return (
+        "query {\n"
+        f"  nodes(ids: {json.dumps(ids)}) {{ ... on Repository {{ id isArchived }} }}\n"
+        "}"
+    )
+
+
+def get_nodes_queries(ids, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = DEFAULT_NODES_CHUNK_SIZE
+    return [
+        (ids[i : i + chunk_size], get_nodes_query(ids[i : i + chunk_size]))
+        for i in range(0, len(ids), chunk_size)
+    ]
+
+
 def merge_results(results):
     # merge an array of dicts into a single dict
     merged = {}
@@ -175,15 +405,18 @@ def merge_results(results):
 def query_github_api(gh_token, query):
     logger.info(f"Querying GitHub API:\n{query}")
 
-    resp = requests.post(
-        "https://api.github.com/graphql",
-        json={"query": query},
-        headers={"Authorization": f"token {gh_token}"},
+    resp = github_request(
+        gh_token, "POST", "https://api.github.com/graphql", json={"query": query}
     )
     resp.raise_for_status()
     body = resp.json()
     logger.info(f"Response from GitHub API:\n{json.dumps(body, indent=2)}")
 
+    if body.get("data") is None:
+        # e.g: every token is rate limited
+        raise Exception(
+            f"Encountered errors calling GitHub API:\n{json.dumps(body.get('errors'), indent=2)}"
+        )
     if body.get("errors"):
         logger.warning(
             f"Encountered errors calling GitHub API:\n{json.dumps(body['errors'], indent=2)}"
@@ -192,6 +425,174 @@ def query_github_api(gh_token, query):
     return body["data"]
 
 
+def get_cache_path():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "pip-abandoned" / "repos.json"
+
+
+def load_cache(path):
+    try:
+        return json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning(f"Ignoring invalid cache file {path}")
+        return {}
+
+
+def save_cache(path, cache):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+
+def get_cache_key(repo):
+    return "/".join(get_owner_and_name(repo)).lower()
+
+
+def revalidate_repo(session, gh_token, key, entry):
+    headers = {}
+    if entry.get("etag"):
+        # A 304 response to a conditional request doesn't count against the rate limit
+        headers["If-None-Match"] = entry["etag"]
+
+    resp = github_request(
+        gh_token,
+        "GET",
+        f"https://api.github.com/repos/{key}",
+        session=session,
+        headers=headers,
+    )
+    logger.info(f"Revalidating {key}: HTTP {resp.status_code}")
+
+    if resp.status_code == 304:
+        return entry
+    if resp.status_code == 404:
+        return None
+    resp.raise_for_status()
+    body = resp.json()
+    return {
+        "isArchived": body["archived"],
+        "etag": resp.headers.get("ETag"),
+        "id": body.get("node_id"),
+    }
+
+
+def has_archived(api_data):
+    return any(v and v.get("isArchived") for v in api_data.values())
+
+
+def revalidate_cached_repos(gh_token, cache, keys, max_workers=None, fail_fast=False):
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    revalidated = {}
+    with requests.Session() as session:
+        session.mount("https://", HTTPAdapter(pool_maxsize=max_workers))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    revalidate_repo, session, gh_token, key, cache[key]
+                ): key
+                for key in keys
+            }
+            for future in as_completed(futures):
+                entry = future.result()
+                revalidated[futures[future]] = entry
+                if fail_fast and entry and entry["isArchived"]:
+                    executor.shutdown(cancel_futures=True)
+                    break
+    return revalidated
+
+
+def revalidate_cached_repos_by_id(gh_token, cache, keys, fail_fast=False):
+    keys_by_id = {}
+    for key in keys:
+        keys_by_id.setdefault(cache[key]["id"], []).append(key)
+
+    revalidated = {}
+    for ids, query in get_nodes_queries(list(keys_by_id)):
+        nodes = query_github_api(gh_token, query)["nodes"]
+        # nodes are returned in the same order as the ids we asked for
+        for id_, node in zip(ids, nodes):
+            for key in keys_by_id[id_]:
+                revalidated[key] = (
+                    {**cache[key], "isArchived": node["isArchived"]} if node else None
+                )
+        if fail_fast and any(node and node["isArchived"] for node in nodes):
+            break
+    return revalidated
+
+
+def is_revalidatable(cache, key, revalidate):
+    if revalidate == "nodes":
+        return key in cache and bool(cache[key].get("id"))
+    return key in cache
+
+
+def get_repo_statuses(
+    gh_token, dist_urls, cache=None, fail_fast=False, revalidate="etag"
+):
+    # Repos we've seen before are revalidated, either with conditional REST
+    # requests or by looking up their node IDs in batches.
+    # Anything else is fetched in batches from the GraphQL API by owner/name.
+    # In fail_fast mode, we stop as soon as we find an archived repo.
+    if cache is None:
+        cache = {}
+
+    cached = [
+        (dist, repo)
+        for dist, repo in dist_urls
+        if is_revalidatable(cache, get_cache_key(repo), revalidate)
+    ]
+    fresh = [
+        (dist, repo)
+        for dist, repo in dist_urls
+        if not is_revalidatable(cache, get_cache_key(repo), revalidate)
+    ]
+
+    results = []
+
+    if len(cached) > 0:
+        keys = sorted({get_cache_key(repo) for _, repo in cached})
+        if revalidate == "nodes":
+            revalidated = revalidate_cached_repos_by_id(
+                gh_token, cache, keys, fail_fast=fail_fast
+            )
+        else:
+            revalidated = revalidate_cached_repos(
+                gh_token, cache, keys, fail_fast=fail_fast
+            )
+        for key, entry in revalidated.items():
+            if entry is None:
+                del cache[key]
+            else:
+                cache[key] = entry
+        results.append(
+            {
+                normalize_name(dist.name): revalidated[get_cache_key(repo)]
+                for dist, repo in cached
+                if get_cache_key(repo) in revalidated
+            }
+        )
+        if fail_fast and has_archived(results[-1]):
+            return merge_results(results)
+
+    for query in get_graphql_queries(fresh):
+        data = query_github_api(gh_token, query)
+        for dist, repo in fresh:
+            if status := data.get(normalize_name(dist.name)):
+                cache[get_cache_key(repo)] = {
+                    "isArchived": status["isArchived"],
+                    "id": status.get("id"),
+                }
+        results.append(data)
+        if fail_fast and has_archived(data):
+            break
+
+    return merge_results(results)
+
+
 def get_archived_packages(dist_urls, api_data):
     archived_packages_normalized_names = [
         k for k, v in api_data.items() if v and v.get("isArchived")
@@ -209,119 +610,593 @@ def is_inactive(distribution):
     return "Development Status :: 7 - Inactive" in classifiers
 
 
-def has_maintained_no_badge(distribution):
-    description = distribution.metadata.get("Description", "")
-    return "//img.shields.io/maintenance/no" in description
+def wrap_deprecation_pattern(i, pattern):
+    # Global inline flags like (?i) are only allowed at the start of a regex,
+    # so turn them into flags scoped to this pattern's group.
+    # Numbered backreferences would point at the wrong group once the
+    # pattern is wrapped, so they can't be used
+    if NUMBERED_BACKREFERENCE.search(pattern):
+        raise Exception(
+            f"Numbered backreferences are not supported in '{pattern}'. "
+            "Use a named group instead e.g: (?P<name>...)(?P=name)"
+        )
+    flags = ""
+    while m := INLINE_FLAGS.match(pattern):
+        flags += m.group(1)
+        pattern = pattern[m.end() :]
+    if flags:
+        pattern = f"(?{flags}:{pattern})"
+    return f"(?P<_{i}>{pattern})"
+
+
+def compile_deprecation_patterns(patterns):
+    # Combine all the patterns into a single regex so we can find every
+    # signal in one pass over the description. Each pattern is wrapped in
+    # a named group so we can tell which one matched
+    labels = list(patterns)
+    regex = re.compile(
+        "|".join(
+            wrap_deprecation_pattern(i, patterns[label])
+            for i, label in enumerate(labels)
+        ),
+        re.IGNORECASE,
+    )
+    return regex, labels
 
 
-def output_package_repo_table(packages):
-    table = Table(show_header=True)
+default_deprecation_matcher = compile_deprecation_patterns(DEPRECATION_PATTERNS)
 
-    table.add_column("Package")
-    table.add_column("Repo")
 
-    for package, repo in packages:
-        table.add_row(package.name, repo)
+def get_deprecation_signals(distribution, matcher=None):
+    regex, labels = matcher or default_deprecation_matcher
+    description = distribution.metadata.get("Description", "")
+    signals = [labels[int(m.lastgroup[1:])] for m in regex.finditer(description)]
+    return list(dict.fromkeys(signals))
 
-    console.print(table)
+
+def get_report_sections(inactive, unmaintained, archived):
+    # (message if none found, message if some found, table columns, table rows)
+    return [
+        (
+            "No packages with the trove classifier [bold white]'Development Status :: 7 - Inactive'[/] were found",
+            "Packages with the trove classifier [bold white]'Development Status :: 7 - Inactive'[/] were found:",
+            ["Package"],
+            [(package.name,) for package in inactive],
+        ),
+        (
+            "No packages with a [white on black bold]\x5bmaintained[/]|[white on red bold]no][/] badge or deprecation notice were found",
+            "Packages with a [white on black bold]\x5bmaintained[/]|[white on red bold]no][/] badge or deprecation notice were found:",
+            ["Package", "Signals"],
+            [(package.name, ", ".join(signals)) for package, signals in unmaintained],
+        ),
+        (
+            "No packages associated with archived GitHub repos were found",
+            "Packages associated with archived GitHub repos were found:",
+            ["Package", "Repo"],
+            [(package.name, repo) for package, repo in archived],
+        ),
+    ]
 
 
-def output_package_table(packages):
+def output_table(columns, rows):
     table = Table(show_header=True)
 
-    table.add_column("Package")
+    for column in columns:
+        table.add_column(column)
 
-    for package in packages:
-        table.add_row(package.name)
+    for row in rows:
+        table.add_row(*[escape(value or "") for value in row])
 
     console.print(table)
 
 
 def output_console(inactive, unmaintained, archived):
-    console.print("\n")
-    if len(inactive) == 0:
-        console.print(
-            "[green]✔[/] No packages with the trove classifier [bold white]'Development Status :: 7 - Inactive'[/] were found"
-        )
-    else:
-        console.print(
-            "[red]✖[/] Packages with the trove classifier [bold white]'Development Status :: 7 - Inactive'[/] were found:"
-        )
-        output_package_table(inactive)
-    console.print("\n")
+    if not console.is_terminal:
+        # Building Rich tables is wasted effort if stdout is a pipe or file
+        return output_plain(inactive, unmaintained, archived)
 
-    if len(unmaintained) == 0:
-        console.print(
-            "[green]✔[/] No packages with a [white on black bold]\x5bmaintained[/]|[white on red bold]no][/] badge were found"
-        )
-    else:
-        console.print(
-            "[red]✖[/] Packages with a [white on black bold]\x5bmaintained[/]|[white on red bold]no][/] badge were found:"
-        )
-        output_package_table(unmaintained)
     console.print("\n")
+    for none_found, found, columns, rows in get_report_sections(
+        inactive, unmaintained, archived
+    ):
+        if len(rows) == 0:
+            console.print(f"[green]✔[/] {none_found}")
+        else:
+            console.print(f"[red]✖[/] {found}")
+            output_table(columns, rows)
+        console.print("\n")
+
+
+def output_plain(inactive, unmaintained, archived):
+    write = sys.stdout.write
+    for none_found, found, _, rows in get_report_sections(
+        inactive, unmaintained, archived
+    ):
+        if len(rows) == 0:
+            write(f"✔ {Text.from_markup(none_found).plain}\n")
+        else:
+            write(f"✖ {Text.from_markup(found).plain}\n")
+            for row in rows:
+                write("  " + "\t".join(value or "" for value in row) + "\n")
 
-    if len(archived) == 0:
-        console.print(
-            "[green]✔[/] No packages associated with archived GitHub repos were found"
-        )
-    else:
-        console.print(
-            "[red]✖[/] Packages associated with archived GitHub repos were found:"
-        )
-        output_package_repo_table(archived)
-    console.print("\n")
+
+def write_json(data):
+    json.dump(data, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+def write_delimited(columns, rows, format_):
+    writer = csv.writer(
+        sys.stdout,
+        delimiter="\t" if format_ == "tsv" else ",",
+        lineterminator="\n",
+    )
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
 
 
 def output_json(inactive, unmaintained, archived):
-    print_json(
-        data={
+    write_json(
+        {
             "inactive": [p.name for p in inactive],
-            "unmaintained": [p.name for p in unmaintained],
+            "unmaintained": [p.name for p, _ in unmaintained],
             "archived": [p.name for p, _ in archived],
         }
     )
 
 
-def search_virtualenv_path(gh_token, path, verbosity, format_="text"):
-    set_log_level(verbosity)
+def output_delimited(inactive, unmaintained, archived, format_):
+    write_delimited(
+        ["signal", "package", "repo", "details"],
+        (
+            *[("inactive", p.name, "", "") for p in inactive],
+            *[("unmaintained", p.name, "", ", ".join(s)) for p, s in unmaintained],
+            *[("archived", p.name, repo, "") for p, repo in archived],
+        ),
+        format_,
+    )
+
+
+def output_report(inactive, unmaintained, archived, format_="text"):
+    if format_ == "json":
+        output_json(inactive, unmaintained, archived)
+    elif format_ in ("csv", "tsv"):
+        output_delimited(inactive, unmaintained, archived, format_)
+    else:
+        output_console(inactive, unmaintained, archived)
+
+
+def get_exit_code(inactive, unmaintained, archived):
+    if len(inactive) == 0 and len(unmaintained) == 0 and len(archived) == 0:
+        return 0
+    return 9
+
 
+def get_distributions(path):
     dists = list(distributions(path=[path]))
     if len(dists) == 0:
         raise Exception(f"Couldn't find any packages in {path}")
+    return dists
 
-    inactive_packages = [dist for dist in dists if is_inactive(dist)]
-    unmaintained_packages = [dist for dist in dists if has_maintained_no_badge(dist)]
 
-    dist_urls = []
-    for distribution in dists:
-        url = get_github_repo_url(distribution)
-        if url:
-            dist_urls.append((distribution, url))
-
-    archived_packages = []
-    if len(dist_urls) > 0:
-        queries = get_graphql_queries(dist_urls)
-        results = merge_results(
-            [query_github_api(gh_token, query) for query in queries]
-        )
-        archived_packages = get_archived_packages(dist_urls, results)
+class ArchiveDistribution(Distribution):
+    # A distribution we have read the metadata of from a wheel or sdist
+    # without extracting or installing it
+
+    def __init__(self, path, metadata):
+        self._path = path
+        self._metadata = metadata
+
+    def read_text(self, filename):
+        if filename in ("METADATA", "PKG-INFO"):
+            return self._metadata
+        return None
+
+    def locate_file(self, path):
+        return self._path.parent / path
+
+
+def is_metadata_file(name, filenames, directory_suffix=""):
+    # METADATA/PKG-INFO must be at the top level of the archive
+    # e.g: foo-1.0.0.dist-info/METADATA or foo-1.0.0/PKG-INFO
+    parts = name.split("/")
+    return (
+        len(parts) == 2
+        and parts[0].endswith(directory_suffix)
+        and parts[1] in filenames
+    )
+
+
+def read_zip_metadata(path, filenames, directory_suffix=""):
+    # Only the central directory and the matching member are read
+    with zipfile.ZipFile(path) as zf:
+        for name in zf.namelist():
+            if is_metadata_file(name, filenames, directory_suffix):
+                return zf.read(name).decode("utf-8")
+    return None
+
+
+def read_tar_metadata(path, filenames):
+    with tarfile.open(path) as tf:
+        for member in tf:
+            if member.isfile() and is_metadata_file(member.name, filenames):
+                return tf.extractfile(member).read().decode("utf-8")
+    return None
+
+
+def read_archive_metadata(path):
+    try:
+        if path.name.endswith(".whl"):
+            # A wheel may contain other files called METADATA
+            return read_zip_metadata(path, ["METADATA"], ".dist-info")
+        if path.name.endswith(".zip"):
+            return read_zip_metadata(path, ["PKG-INFO"])
+        return read_tar_metadata(path, ["PKG-INFO"])
+    except (OSError, UnicodeDecodeError, zipfile.BadZipFile, tarfile.TarError) as e:
+        logger.warning(f"Couldn't read {path}: {e}")
+        return None
+
+
+def get_wheelhouse_distributions(wheelhouse, max_workers=None):
+    # Distributions are yielded as soon as their archive has been read,
+    # so a search can start querying the GitHub API while we read the rest
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    archives = sorted(
+        path
+        for path in Path(wheelhouse).rglob("*")
+        if path.name.endswith(ARCHIVE_SUFFIXES) and path.is_file()
+    )
+
+    # A wheelhouse may contain several versions of the same package,
+    # or wheels for several platforms. Only search each package once
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            # Results come back in the same order as the archives,
+            # so the same archive wins each time
+            for path, text in zip(
+                archives, executor.map(read_archive_metadata, archives)
+            ):
+                dist = ArchiveDistribution(path, text) if text else None
+                if not dist or not dist.metadata.get("Name"):
+                    logger.warning(
+                        f"Couldn't find package metadata in {path}. Skipping"
+                    )
+                    continue
+                key = Prepared.normalize(dist.name)
+                if key in seen:
+                    logger.info(f"Already found {dist.name}. Skipping {path}")
+                    continue
+                seen.add(key)
+                yield dist
+        finally:
+            # Don't read any more archives if the caller stops early
+            executor.shutdown(cancel_futures=True)
+
+    if len(seen) == 0:
+        raise Exception(f"Couldn't find any packages in {wheelhouse}")
+
+
+def get_shards(dist_repos, count):
+    # Packages which share a GitHub repo always go in the same shard.
+    # Each group is assigned to the shard with the fewest unique repos so far.
+    # Groups are sorted so every job gets the same shards, whatever order
+    # the packages were found in
+    groups = {}
+    for dist, repo in dist_repos:
+        key = get_cache_key(repo) if repo else f"package:{normalize_name(dist.name)}"
+        groups.setdefault(key, []).append((dist, repo))
+
+    shards = [[] for _ in range(count)]
+    repo_counts = [0] * count
+    for _, group in sorted(groups.items()):
+        group.sort(key=lambda dist_repo: normalize_name(dist_repo[0].name))
+        i = min(range(count), key=lambda i: (repo_counts[i], len(shards[i])))
+        shards[i].extend(group)
+        if group[0][1]:
+            repo_counts[i] += 1
+    return shards
+
+
+def get_repo_index(path):
+    if path is None:
+        return None
+    if not Path(path).exists():
+        raise Exception(f"Couldn't find repo index {path}")
+    return RepoIndex(path)
+
+
+def plan_distributions(dists, count, repo_index_path=None):
+    repo_index = get_repo_index(repo_index_path)
+    dist_repos = [(dist, get_github_repo_url(dist, repo_index)) for dist in dists]
+    shards = get_shards(dist_repos, count)
+    write_json(
+        [
+            {
+                "shard": f"{i}/{count}",
+                "packages": [{"name": dist.name, "repo": repo} for dist, repo in shard],
+            }
+            for i, shard in enumerate(shards, start=1)
+        ]
+    )
+    return 0
+
+
+def plan_virtualenv_path(path, count, verbosity=0, repo_index_path=None):
+    set_log_level(verbosity)
+    return plan_distributions(get_distributions(path), count, repo_index_path)
+
+
+def plan_wheelhouse(wheelhouse, count, verbosity=0, repo_index_path=None):
+    set_log_level(verbosity)
+    return plan_distributions(
+        get_wheelhouse_distributions(wheelhouse), count, repo_index_path
+    )
+
+
+def merge_reports(reports):
+    merged = {"inactive": [], "unmaintained": [], "archived": []}
+    for report in reports:
+        for key, packages in merged.items():
+            packages.extend(p for p in report.get(key, []) if p not in packages)
+    return merged
+
+
+def merge_json_files(files):
+    merged = merge_reports([json.load(f) for f in files])
+    write_json(merged)
+    return get_exit_code(merged["inactive"], merged["unmaintained"], merged["archived"])
+
+
+def get_findings(dist_repos, inactive, unmaintained, archived):
+    repos = {
+        dist.name: get_cache_key(repo) if repo else None for dist, repo in dist_repos
+    }
+    return (
+        [(dist.name, repos[dist.name], "inactive") for dist in inactive]
+        + [(dist.name, repos[dist.name], "unmaintained") for dist, _ in unmaintained]
+        + [(dist.name, repos[dist.name], "archived") for dist, _ in archived]
+    )
 
+
+def get_history_environment(environment, shard=None):
+    # Each shard is recorded as a separate environment, so the latest search
+    # of one shard doesn't hide the findings from the other shards
+    if shard:
+        index, count = shard
+        return f"{environment} (shard {index}/{count})"
+    return environment
+
+
+def check_history_db(path):
+    # Fail before we start searching, rather than after all the work is done
+    try:
+        with closing(history.open_db(path)):
+            pass
+    except sqlite3.Error as e:
+        raise Exception(f"Couldn't open history database {path}: {e}")
+
+
+def record_history(path, environment, findings):
+    with closing(history.open_db(path)) as conn:
+        history.record_scan(conn, environment, findings)
+
+
+def output_history(columns, rows, format_="text"):
     if format_ == "json":
-        output_json(inactive_packages, unmaintained_packages, archived_packages)
+        write_json([dict(row) for row in rows])
+    elif format_ in ("csv", "tsv"):
+        write_delimited(columns, rows, format_)
+    elif len(rows) == 0:
+        console.print("No matching findings were found")
+    elif not console.is_terminal:
+        write_delimited(columns, rows, "tsv")
     else:
-        output_console(inactive_packages, unmaintained_packages, archived_packages)
+        output_table(
+            [column.replace("_", " ").capitalize() for column in columns], rows
+        )
 
-    if (
-        len(inactive_packages) == 0
-        and len(unmaintained_packages) == 0
-        and len(archived_packages) == 0
-    ):
-        return 0
-    return 9
 
+def search_history(path, format_="text", since=None, **filters):
+    if not Path(path).exists():
+        raise Exception(f"Couldn't find history database {path}")
+
+    if filters.get("repo") and "://" in filters["repo"]:
+        filters["repo"] = get_cache_key(filters["repo"])
+    elif filters.get("repo"):
+        filters["repo"] = filters["repo"].lower()
+
+    with closing(history.open_db(path)) as conn:
+        if since:
+            columns = history.NEW_FINDINGS_COLUMNS
+            rows = history.get_new_findings(conn, since, **filters)
+        else:
+            columns = history.CURRENT_FINDINGS_COLUMNS
+            rows = history.get_current_findings(conn, **filters)
+
+    output_history(columns, rows, format_)
+    return 0
+
+
+def forget_history(path, environment):
+    if not Path(path).exists():
+        raise Exception(f"Couldn't find history database {path}")
+
+    with closing(history.open_db(path)) as conn:
+        count = history.forget_environment(conn, environment)
+
+    searches = "search" if count == 1 else "searches"
+    console.print(f"Removed {count} {searches} of {escape(environment)} from {path}")
+    return 0
+
+
+def build_repo_index(output, history_paths=(), paths=(), wheelhouses=(), verbosity=0):
+    set_log_level(verbosity)
+
+    repos = {}
+    for path in history_paths:
+        if not Path(path).exists():
+            raise Exception(f"Couldn't find history database {path}")
+        with closing(history.open_db(path)) as conn:
+            repos.update(history.get_package_repos(conn))
+
+    # Package metadata takes precedence over scan history.
+    # Only packages which point at exactly one repo are used
+    dists = [dist for path in paths for dist in get_distributions(path)] + [
+        dist for path in wheelhouses for dist in get_wheelhouse_distributions(path)
+    ]
+    for dist in dists:
+        urls = get_candidate_repo_urls(dist)
+        if len(urls) == 1:
+            repos[Prepared.normalize(dist.name)] = "/".join(get_owner_and_name(urls[0]))
 
-def search_requirements_files(gh_token, requirements, verbosity, format_="text"):
+    count = write_repo_index(output, repos)
+    console.print(f"Wrote {count} packages to {output}")
+    return 0
+
+
+def put_or_abandon(queue_, item, consumer):
+    # Block until there is space in the queue,
+    # unless the consumer has stopped (e.g: because it raised an exception)
+    while not consumer.done():
+        try:
+            queue_.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def dispatch_chunks(gh_token, chunks, cache, fail_fast, revalidate, stop):
+    # Consumer: query the GitHub API for each chunk of repos as it arrives
+    results = []
+    while (chunk := chunks.get()) is not None:
+        if stop.is_set():
+            # keep draining the queue so the producer never blocks
+            continue
+        data = get_repo_statuses(gh_token, chunk, cache, fail_fast, revalidate)
+        results.append(data)
+        if fail_fast and has_archived(data):
+            stop.set()
+    return merge_results(results)
+
+
+def search_distributions(
+    gh_token,
+    dists,
+    format_="text",
+    cache_path=None,
+    shard=None,
+    fail_fast=False,
+    deprecation_patterns=None,
+    history_path=None,
+    environment=None,
+    revalidate="etag",
+    repo_index_path=None,
+    chunk_size=None,
+):
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+
+    if history_path:
+        check_history_db(history_path)
+
+    # Repo URLs are found lazily, so we can start querying the GitHub API
+    # while we are still reading package metadata.
+    # Sharding has to see every package before it can split them up
+    repo_index = get_repo_index(repo_index_path)
+    dist_repos = ((dist, get_github_repo_url(dist, repo_index)) for dist in dists)
+    if shard:
+        index, count = shard
+        dist_repos = get_shards(list(dist_repos), count)[index - 1]
+
+    matcher = default_deprecation_matcher
+    if deprecation_patterns:
+        matcher = compile_deprecation_patterns(
+            {**DEPRECATION_PATTERNS, **deprecation_patterns}
+        )
+
+    cache = load_cache(cache_path) if cache_path else None
+
+    searched = []
+    inactive_packages = []
+    unmaintained_packages = []
+    dist_urls = []
+    chunk = []
+
+    # Producer: check each package's metadata and queue up full chunks of
+    # repos for the consumer. The queue is bounded so we can't get too far ahead
+    chunks = queue.Queue(maxsize=DEFAULT_QUEUE_SIZE)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        consumer = executor.submit(
+            dispatch_chunks, gh_token, chunks, cache, fail_fast, revalidate, stop
+        )
+        try:
+            for dist, repo in dist_repos:
+                if stop.is_set() or consumer.done():
+                    break
+                searched.append((dist, repo))
+
+                if is_inactive(dist):
+                    inactive_packages.append(dist)
+                if signals := get_deprecation_signals(dist, matcher):
+                    unmaintained_packages.append((dist, signals))
+                if fail_fast and (inactive_packages or unmaintained_packages):
+                    logger.info("Found inactive or unmaintained package. Stopping")
+                    stop.set()
+                    break
+
+                if repo:
+                    dist_urls.append((dist, repo))
+                    chunk.append((dist, repo))
+                if len(chunk) == chunk_size:
+                    put_or_abandon(chunks, chunk, consumer)
+                    chunk = []
+
+            if len(chunk) > 0 and not stop.is_set():
+                put_or_abandon(chunks, chunk, consumer)
+        finally:
+            put_or_abandon(chunks, None, consumer)
+
+        results = consumer.result()
+
+    archived_packages = get_archived_packages(dist_urls, results)
+
+    if cache_path:
+        save_cache(cache_path, cache)
+
+    if history_path:
+        record_history(
+            history_path,
+            get_history_environment(environment, shard),
+            get_findings(
+                searched, inactive_packages, unmaintained_packages, archived_packages
+            ),
+        )
+
+    output_report(inactive_packages, unmaintained_packages, archived_packages, format_)
+
+    return get_exit_code(inactive_packages, unmaintained_packages, archived_packages)
+
+
+def search_virtualenv_path(gh_token, path, verbosity, format_="text", **kwargs):
+    set_log_level(verbosity)
+    return search_distributions(gh_token, get_distributions(path), format_, **kwargs)
+
+
+def search_wheelhouse(gh_token, wheelhouse, verbosity, format_="text", **kwargs):
+    set_log_level(verbosity)
+    return search_distributions(
+        gh_token, get_wheelhouse_distributions(wheelhouse), format_, **kwargs
+    )
+
+
+def search_requirements_files(
+    gh_token, requirements, verbosity, format_="text", **kwargs
+):
     with TemporaryDirectory() as tempdir:
         site_packages = create_temp_virtualenv(tempdir)
 
@@ -332,4 +1207,6 @@ def search_requirements_files(gh_token, requirements, verbosity, format_="text")
 
         subprocess.run(command, capture_output=True)
 
-        return search_virtualenv_path(gh_token, site_packages, verbosity, format_)
+        return search_virtualenv_path(
+            gh_token, site_packages, verbosity, format_, **kwargs
+        )
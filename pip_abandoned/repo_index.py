@@ -0,0 +1,82 @@
+import logging
+import mmap
+from importlib.metadata import Prepared
+from pathlib import Path
+
+# Bump this if the file format changes
+VERSION = 1
+HEADER = f"# pip-abandoned repo index v{VERSION}\n".encode("utf-8")
+
+BUNDLED_INDEX_PATH = Path(__file__).parent / "data" / "repo-index.txt"
+
+logger = logging.getLogger(__name__)
+
+
+class RepoIndex:
+    # Maps normalized package names to GitHub repos (owner/name).
+    # The file is a header followed by sorted "<name>\t<owner/name>" lines.
+    # It is memory-mapped the first time we look something up, and each
+    # lookup is a binary search over the lines, so we never parse the whole file
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = None
+
+    def open(self):
+        if self.data is not None:
+            return self.data
+
+        self.data = b""
+        try:
+            with open(self.path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Couldn't read repo index {self.path}: {e}")
+            return self.data
+
+        if data[: len(HEADER)] != HEADER:
+            logger.warning(f"Ignoring repo index {self.path}: unsupported version")
+            data.close()
+            return self.data
+
+        self.data = data
+        return self.data
+
+    def lookup(self, name):
+        data = self.open()
+        key = Prepared.normalize(name).encode("utf-8")
+
+        lo = len(HEADER)
+        hi = len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b"\n", lo, mid) + 1 or lo
+            end = data.find(b"\n", start, hi)
+            if end == -1:
+                end = hi
+            line_key, _, repo = data[start:end].partition(b"\t")
+            if line_key == key:
+                return repo.decode("utf-8")
+            if line_key < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+
+def write_repo_index(path, repos):
+    # repos is a dict of {package name: owner/name}
+    entries = sorted(
+        (Prepared.normalize(name).encode("utf-8"), repo.encode("utf-8"))
+        for name, repo in repos.items()
+    )
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER)
+        for key, repo in entries:
+            f.write(key + b"\t" + repo + b"\n")
+    return len(entries)
+
+
+bundled_repo_index = RepoIndex(BUNDLED_INDEX_PATH)
@@ -1,6 +1,6 @@
 import pytest
 
-from pip_abandoned.cli import get_parser
+from pip_abandoned.cli import cli, get_parser
 
 
 def test_virtualenv_path():
@@ -27,9 +27,194 @@ def test_multiple_requirements_files():
     assert args.path is None
 
 
+def test_wheelhouse():
+    parser = get_parser()
+    args = parser.parse_args(["search", "--wheelhouse", "foo/bar"])
+    assert str(args.wheelhouse) == "foo/bar"
+    assert args.path is None
+    assert args.requirements is None
+
+
 def test_invalid_combination():
     parser = get_parser()
     with pytest.raises(SystemExit):
         parser.parse_args(
             ["search", "-r", "./tests/fixture_data/reqs-pass.txt", "foo/bar"]
         )
+
+
+def test_cache():
+    parser = get_parser()
+    assert parser.parse_args(["search", "foo/bar"]).cache is False
+    assert parser.parse_args(["search", "foo/bar", "--cache"]).cache is True
+
+
+def test_shard():
+    parser = get_parser()
+    assert parser.parse_args(["search", "foo/bar"]).shard is None
+    assert parser.parse_args(["search", "foo/bar", "--shard", "2/4"]).shard == (2, 4)
+
+
+@pytest.mark.parametrize("value", ["2", "0/4", "5/4", "a/b", "1/0"])
+def test_invalid_shard(value):
+    parser = get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["search", "foo/bar", "--shard", value])
+
+
+def test_plan():
+    parser = get_parser()
+    args = parser.parse_args(["plan", "foo/bar", "--shards", "4"])
+    assert str(args.path) == "foo/bar"
+    assert args.shards == 4
+
+
+def test_plan_wheelhouse():
+    parser = get_parser()
+    args = parser.parse_args(["plan", "--wheelhouse", "foo/bar", "--shards", "4"])
+    assert str(args.wheelhouse) == "foo/bar"
+    assert args.path is None
+
+
+def test_repo_index():
+    parser = get_parser()
+    assert parser.parse_args(["search", "foo/bar"]).repo_index is None
+    args = parser.parse_args(["search", "foo/bar", "--repo-index", "index.txt"])
+    assert str(args.repo_index) == "index.txt"
+    args = parser.parse_args(
+        ["plan", "foo/bar", "--shards", "4", "--repo-index", "index.txt"]
+    )
+    assert str(args.repo_index) == "index.txt"
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["plan", "--shards", "4"],
+        ["plan", "foo/bar"],
+        ["plan", "foo/bar", "--shards", "0"],
+        ["plan", "foo/bar", "--wheelhouse", "baz", "--shards", "4"],
+    ],
+)
+def test_invalid_plan(argv):
+    parser = get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(argv)
+
+
+def test_merge():
+    parser = get_parser()
+    file1 = "./tests/fixture_data/reqs-pass.txt"
+    file2 = "./tests/fixture_data/reqs-fail.txt"
+    args = parser.parse_args(["merge", file1, file2])
+    assert [r.name for r in args.reports] == [file1, file2]
+
+
+def test_fail_fast():
+    parser = get_parser()
+    assert parser.parse_args(["search", "foo/bar"]).fail_fast is False
+    assert parser.parse_args(["search", "foo/bar", "--fail-fast"]).fail_fast is True
+
+
+def test_deprecation_patterns():
+    parser = get_parser()
+    args = parser.parse_args(
+        [
+            "search",
+            "foo/bar",
+            "--deprecation-pattern",
+            "foo",
+            "--deprecation-pattern",
+            "ba[rz]",
+        ]
+    )
+    assert args.deprecation_patterns == ["foo", "ba[rz]"]
+
+
+def test_invalid_deprecation_pattern():
+    parser = get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["search", "foo/bar", "--deprecation-pattern", "("])
+
+
+@pytest.mark.parametrize("pattern", [r"(un)\1maintained", r"(a)?(?(1)b|c)"])
+def test_numbered_backreference_deprecation_pattern(pattern):
+    parser = get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["search", "foo/bar", "--deprecation-pattern", pattern])
+
+
+def test_inline_flags_deprecation_pattern():
+    parser = get_parser()
+    args = parser.parse_args(
+        ["search", "foo/bar", "--deprecation-pattern", "(?s)foo.bar"]
+    )
+    assert args.deprecation_patterns == ["(?s)foo.bar"]
+
+
+def test_history_db():
+    parser = get_parser()
+    args = parser.parse_args(
+        ["search", "foo/bar", "--history-db", "h.db", "--environment", "prod"]
+    )
+    assert str(args.history_db) == "h.db"
+    assert args.environment == "prod"
+
+
+def test_history_db_with_fail_fast(monkeypatch):
+    monkeypatch.setattr(
+        "sys.argv",
+        ["pip-abandoned", "search", "foo/bar", "--history-db", "h.db", "--fail-fast"],
+    )
+    with pytest.raises(SystemExit):
+        cli()
+
+
+def test_history():
+    parser = get_parser()
+    args = parser.parse_args(
+        ["history", "h.db", "--package", "foo", "--since", "2026-01-01"]
+    )
+    assert str(args.path) == "h.db"
+    assert args.package == "foo"
+    assert args.since == "2026-01-01T00:00:00+00:00"
+
+
+def test_history_forget_without_environment(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pip-abandoned", "history", "h.db", "--forget"])
+    with pytest.raises(SystemExit):
+        cli()
+
+
+def test_history_since_with_timezone():
+    parser = get_parser()
+    args = parser.parse_args(["history", "h.db", "--since", "2026-01-01T02:00+02:00"])
+    assert args.since == "2026-01-01T00:00:00+00:00"
+
+
+def test_invalid_history_since():
+    parser = get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["history", "h.db", "--since", "last tuesday"])
+
+
+def test_set_token():
+    parser = get_parser()
+    assert parser.parse_args(["set-token"]).add is False
+    assert parser.parse_args(["set-token", "--add"]).add is True
+
+
+def test_revalidate():
+    parser = get_parser()
+    assert parser.parse_args(["search", "foo/bar"]).revalidate == "etag"
+    args = parser.parse_args(["search", "foo/bar", "--revalidate", "nodes"])
+    assert args.revalidate == "nodes"
+
+
+@pytest.mark.parametrize("format_", ["text", "json", "csv", "tsv"])
+def test_format(format_):
+    parser = get_parser()
+    assert (
+        parser.parse_args(["search", "foo/bar", "--format", format_]).format == format_
+    )
+    assert parser.parse_args(["history", "h.db", "--format", format_]).format == format_
@@ -21,9 +21,9 @@ def get_requirements_fixture(name):
 def test_help():
     result = subprocess.run(["pip-abandoned", "--help"], capture_output=True)
     assert result.returncode == 0
-    assert result.stdout == get_parser().format_help().replace(
-        "pytest", "pip-abandoned"
-    ).encode("utf-8")
+    parser = get_parser()
+    parser.prog = "pip-abandoned"
+    assert result.stdout == parser.format_help().encode("utf-8")
 
 
 def test_version():
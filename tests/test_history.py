@@ -0,0 +1,130 @@
+from contextlib import closing
+
+import pytest
+
+from pip_abandoned import history
+
+
+@pytest.fixture
+def conn(tmp_path):
+    with closing(history.open_db(tmp_path / "history.db")) as conn:
+        history.record_scan(
+            conn,
+            "service-a",
+            [
+                ("commonmark", "readthedocs/commonmark.py", "archived"),
+                ("Foo_Bar", None, "inactive"),
+            ],
+            scanned_at="2026-01-01T00:00:00+00:00",
+        )
+        history.record_scan(
+            conn,
+            "service-b",
+            [("commonmark", "readthedocs/commonmark.py", "archived")],
+            scanned_at="2026-02-01T00:00:00+00:00",
+        )
+        history.record_scan(
+            conn,
+            "service-a",
+            [
+                ("foo-bar", None, "inactive"),
+                ("baz", "octocat/baz", "archived"),
+            ],
+            scanned_at="2026-03-01T00:00:00+00:00",
+        )
+        yield conn
+
+
+def as_tuples(rows):
+    return [tuple(row) for row in rows]
+
+
+class TestGetCurrentFindings:
+    def test_latest_scan_per_environment(self, conn):
+        assert as_tuples(history.get_current_findings(conn)) == [
+            (
+                "service-a",
+                "2026-03-01T00:00:00+00:00",
+                "baz",
+                "octocat/baz",
+                "archived",
+            ),
+            ("service-a", "2026-03-01T00:00:00+00:00", "foo-bar", None, "inactive"),
+            (
+                "service-b",
+                "2026-02-01T00:00:00+00:00",
+                "commonmark",
+                "readthedocs/commonmark.py",
+                "archived",
+            ),
+        ]
+
+    def test_columns(self, conn):
+        rows = history.get_current_findings(conn)
+        assert list(rows[0].keys()) == history.CURRENT_FINDINGS_COLUMNS
+
+    def test_package(self, conn):
+        rows = history.get_current_findings(conn, package="CommonMark")
+        assert [row["environment"] for row in rows] == ["service-b"]
+
+    def test_normalized_package_name(self, conn):
+        rows = history.get_current_findings(conn, package="foo.bar")
+        assert [row["package"] for row in rows] == ["foo-bar"]
+
+    def test_repo(self, conn):
+        rows = history.get_current_findings(conn, repo="octocat/baz")
+        assert [row["package"] for row in rows] == ["baz"]
+
+    def test_environment_and_signal(self, conn):
+        rows = history.get_current_findings(
+            conn, environment="service-a", signal="archived"
+        )
+        assert [row["package"] for row in rows] == ["baz"]
+
+
+class TestGetNewFindings:
+    def test_since(self, conn):
+        rows = history.get_new_findings(conn, "2026-01-15")
+        assert as_tuples(rows) == [
+            ("baz", "octocat/baz", "archived", "2026-03-01T00:00:00+00:00"),
+        ]
+
+    def test_columns(self, conn):
+        rows = history.get_new_findings(conn, "2025-01-01")
+        assert list(rows[0].keys()) == history.NEW_FINDINGS_COLUMNS
+
+    def test_since_beginning(self, conn):
+        rows = history.get_new_findings(conn, "2025-01-01")
+        assert [(row["package"], row["first_seen"]) for row in rows] == [
+            ("commonmark", "2026-01-01T00:00:00+00:00"),
+            ("Foo_Bar", "2026-01-01T00:00:00+00:00"),
+            ("baz", "2026-03-01T00:00:00+00:00"),
+        ]
+
+    def test_filters(self, conn):
+        rows = history.get_new_findings(conn, "2025-01-01", environment="service-b")
+        assert [(row["package"], row["first_seen"]) for row in rows] == [
+            ("commonmark", "2026-02-01T00:00:00+00:00"),
+        ]
+
+
+def test_forget_environment(conn):
+    assert history.forget_environment(conn, "service-a") == 2
+    assert history.forget_environment(conn, "service-a") == 0
+    rows = history.get_new_findings(conn, "2025-01-01")
+    assert [(row["package"], row["first_seen"]) for row in rows] == [
+        ("commonmark", "2026-02-01T00:00:00+00:00"),
+    ]
+
+
+def test_get_package_repos(conn):
+    history.record_scan(
+        conn,
+        "service-c",
+        [("CommonMark", "readthedocs/commonmark-py", "archived")],
+        scanned_at="2026-04-01T00:00:00+00:00",
+    )
+    assert history.get_package_repos(conn) == {
+        "commonmark": "readthedocs/commonmark-py",
+        "baz": "octocat/baz",
+    }
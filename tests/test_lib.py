@@ -1,5 +1,8 @@
 import json
-from contextlib import redirect_stdout
+import tarfile
+import threading
+import zipfile
+from contextlib import closing, redirect_stdout
 from importlib.metadata import Distribution
 from io import StringIO
 from pathlib import Path
@@ -7,10 +10,12 @@ from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
+import requests
 import responses
 from rich.console import Console
 
-from pip_abandoned import lib
+from pip_abandoned import history, lib
+from pip_abandoned.repo_index import RepoIndex, write_repo_index
 
 # Disable Rich formatting so we can more easily make assertions about text output
 lib.console = Console(force_terminal=True, _environ={"TERM": "dumb"}, soft_wrap=True)
@@ -20,6 +25,39 @@ def get_dist_fixture(name):
     return Distribution.at(Path(".") / "tests" / "fixture_data" / name)
 
 
+def get_metadata_fixture(name):
+    return Path(".") / "tests" / "fixture_data" / name / "METADATA"
+
+
+def make_wheel(directory, name):
+    path = directory / f"{name}-1.0.0-py3-none-any.whl"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(f"{name.replace('-', '_')}/__init__.py", "")
+        zf.write(
+            get_metadata_fixture(f"{name}-1.0.0.dist-info"),
+            f"{name.replace('-', '_')}-1.0.0.dist-info/METADATA",
+        )
+    return path
+
+
+def make_sdist(directory, name):
+    path = directory / f"{name}-1.0.0.tar.gz"
+    with tarfile.open(path, "w:gz") as tf:
+        tf.add(
+            get_metadata_fixture(f"{name}-1.0.0.dist-info"),
+            f"{name}-1.0.0/PKG-INFO",
+        )
+    return path
+
+
+@pytest.fixture
+def wheelhouse(tmp_path):
+    make_wheel(tmp_path, "inactive")
+    make_wheel(tmp_path, "home-page")
+    make_sdist(tmp_path, "readme")
+    return tmp_path
+
+
 @pytest.fixture
 def mock_distributions_no_packages():
     with patch("pip_abandoned.lib.distributions") as mock:
@@ -81,7 +119,10 @@ class TestSearchVirtualenv:
             "Packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "No packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "No packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "No packages associated with archived GitHub repos were found" in stdout
         assert exit_code == 9
 
@@ -94,7 +135,10 @@ class TestSearchVirtualenv:
             "No packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "Packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "Packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "No packages associated with archived GitHub repos were found" in stdout
         assert exit_code == 9
 
@@ -114,7 +158,10 @@ class TestSearchVirtualenv:
             "No packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "No packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "No packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "Packages associated with archived GitHub repos were found:" in stdout
         assert exit_code == 9
 
@@ -134,7 +181,10 @@ class TestSearchVirtualenv:
             "No packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "No packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "No packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "No packages associated with archived GitHub repos were found" in stdout
         assert exit_code == 0
 
@@ -154,7 +204,10 @@ class TestSearchVirtualenv:
             "No packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "No packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "No packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "Packages associated with archived GitHub repos were found:" in stdout
         assert exit_code == 9
 
@@ -174,7 +227,10 @@ class TestSearchVirtualenv:
             "No packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "No packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "No packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "No packages associated with archived GitHub repos were found" in stdout
         assert exit_code == 0
 
@@ -194,7 +250,10 @@ class TestSearchVirtualenv:
             "Packages with the trove classifier 'Development Status :: 7 - Inactive' were found"
             in stdout
         )
-        assert "Packages with a [maintained|no] badge were found" in stdout
+        assert (
+            "Packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
         assert "Packages associated with archived GitHub repos were found:" in stdout
         assert exit_code == 9
 
@@ -219,12 +278,666 @@ class TestSearchVirtualenv:
         }
         assert exit_code == 9
 
+    def test_shard(self, mock_all_errors):
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_virtualenv_path(
+                "fake_token", "/fake/path", 0, "json", shard=(2, 2)
+            )
+            stdout = buf.getvalue()
+
+        assert json.loads(stdout) == {
+            "inactive": ["inactive"],
+            "unmaintained": ["readme"],
+            "archived": [],
+        }
+        assert exit_code == 9
+
+    @responses.activate
+    @pytest.mark.parametrize(
+        "format_,expected",
+        [
+            (
+                "csv",
+                "signal,package,repo,details\n"
+                "inactive,inactive,,\n"
+                'unmaintained,readme,,"[maintained|no] badge, dead"\n'
+                "archived,home-page,https://github.com/chris48s/does-not-exist,\n",
+            ),
+            (
+                "tsv",
+                "signal\tpackage\trepo\tdetails\n"
+                "inactive\tinactive\t\t\n"
+                "unmaintained\treadme\t\t[maintained|no] badge, dead\n"
+                "archived\thome-page\thttps://github.com/chris48s/does-not-exist\t\n",
+            ),
+        ],
+    )
+    def test_delimited_output(self, mock_all_errors, format_, expected):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_virtualenv_path(
+                "fake_token",
+                "/fake/path",
+                0,
+                format_,
+                deprecation_patterns={"dead": "this package is dead"},
+            )
+            stdout = buf.getvalue()
+
+        assert stdout == expected
+        assert exit_code == 9
+
+    @responses.activate
+    def test_plain_text_output_when_not_a_terminal(self, mock_all_errors):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+        with patch("pip_abandoned.lib.console", Console()):
+            with StringIO() as buf, redirect_stdout(buf):
+                exit_code = lib.search_virtualenv_path("fake_token", "/fake/path", 0)
+                stdout = buf.getvalue()
+
+        assert stdout == (
+            "✖ Packages with the trove classifier 'Development Status :: 7 - Inactive' were found:\n"
+            "  inactive\n"
+            "✖ Packages with a [maintained|no] badge or deprecation notice were found:\n"
+            "  readme\t[maintained|no] badge\n"
+            "✖ Packages associated with archived GitHub repos were found:\n"
+            "  home-page\thttps://github.com/chris48s/does-not-exist\n"
+        )
+        assert exit_code == 9
+
+    @responses.activate
+    def test_fail_fast_skips_github_api(self, mock_all_errors):
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_virtualenv_path(
+                "fake_token", "/fake/path", 0, "json", fail_fast=True
+            )
+            stdout = buf.getvalue()
+
+        assert len(responses.calls) == 0
+        assert json.loads(stdout) == {
+            "inactive": ["inactive"],
+            "unmaintained": [],
+            "archived": [],
+        }
+        assert exit_code == 9
+
+    def test_custom_deprecation_pattern(self, mock_distributions_readme):
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_virtualenv_path(
+                "fake_token",
+                "/fake/path",
+                0,
+                deprecation_patterns={"dead": "this package is dead"},
+            )
+            stdout = buf.getvalue()
+
+        assert (
+            "Packages with a [maintained|no] badge or deprecation notice were found"
+            in stdout
+        )
+        assert "[maintained|no] badge, dead" in stdout
+        assert exit_code == 9
+
+    @responses.activate
+    def test_history(self, mock_all_errors, tmp_path):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+        history_path = tmp_path / "history.db"
+        with StringIO() as buf, redirect_stdout(buf):
+            lib.search_virtualenv_path(
+                "fake_token",
+                "/fake/path",
+                0,
+                "json",
+                history_path=history_path,
+                environment="my-env",
+            )
+
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_history(history_path, "json")
+            stdout = buf.getvalue()
+
+        assert [
+            (r["environment"], r["package"], r["repo"], r["signal"])
+            for r in json.loads(stdout)
+        ] == [
+            ("my-env", "home-page", "chris48s/does-not-exist", "archived"),
+            ("my-env", "inactive", None, "inactive"),
+            ("my-env", "readme", None, "unmaintained"),
+        ]
+        assert exit_code == 0
+
+        with StringIO() as buf, redirect_stdout(buf):
+            lib.search_history(
+                history_path,
+                repo="https://github.com/chris48s/Does-Not-Exist",
+            )
+            stdout = buf.getvalue()
+
+        assert "home-page" in stdout
+        assert "inactive" not in stdout
+
+    def test_history_shards(self, mock_all_errors, tmp_path):
+        history_path = tmp_path / "history.db"
+        for index in (1, 2):
+            with StringIO() as buf, redirect_stdout(buf), responses.RequestsMock() as r:
+                r.add(
+                    responses.POST,
+                    "https://api.github.com/graphql",
+                    json={"data": {"_home_page": {"isArchived": True}}},
+                    status=200,
+                )
+                r.assert_all_requests_are_fired = False
+                lib.search_virtualenv_path(
+                    "fake_token",
+                    "/fake/path",
+                    0,
+                    "json",
+                    shard=(index, 2),
+                    history_path=history_path,
+                    environment="my-env",
+                )
+
+        with StringIO() as buf, redirect_stdout(buf):
+            lib.search_history(history_path, "json")
+            stdout = buf.getvalue()
+
+        assert [
+            (r["environment"], r["package"], r["signal"]) for r in json.loads(stdout)
+        ] == [
+            ("my-env (shard 1/2)", "home-page", "archived"),
+            ("my-env (shard 2/2)", "inactive", "inactive"),
+            ("my-env (shard 2/2)", "readme", "unmaintained"),
+        ]
+
+        with StringIO() as buf, redirect_stdout(buf):
+            lib.search_history(history_path, "json", package="home-page")
+            stdout = buf.getvalue()
+
+        assert [r["package"] for r in json.loads(stdout)] == ["home-page"]
+
+    @responses.activate
+    def test_repo_index(self, mock_all_errors, tmp_path):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_inactive": {"isArchived": True}}},
+            status=200,
+        )
+        index_path = tmp_path / "repo-index.txt"
+        write_repo_index(index_path, {"inactive": "octocat/inactive"})
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_virtualenv_path(
+                "fake_token", "/fake/path", 0, "json", repo_index_path=index_path
+            )
+            stdout = buf.getvalue()
+
+        query = json.loads(responses.calls[0].request.body)["query"]
+        assert 'repository(owner: "octocat", name: "inactive")' in query
+        assert json.loads(stdout) == {
+            "inactive": ["inactive"],
+            "unmaintained": ["readme"],
+            "archived": ["inactive"],
+        }
+        assert exit_code == 9
+
+    def test_repo_index_not_found(self, mock_all_errors, tmp_path):
+        with pytest.raises(Exception) as exc:
+            lib.search_virtualenv_path(
+                "fake_token",
+                "/fake/path",
+                0,
+                repo_index_path=tmp_path / "repo-index.txt",
+            )
+        assert "Couldn't find repo index" in str(exc)
+
+    @pytest.mark.parametrize(
+        "since,expected",
+        [
+            (None, "environment,scanned_at,package,repo,signal\n"),
+            ("2026-01-01T00:00:00+00:00", "package,repo,signal,first_seen\n"),
+        ],
+    )
+    def test_history_no_findings_csv(self, tmp_path, since, expected):
+        history_path = tmp_path / "history.db"
+        with closing(history.open_db(history_path)) as conn:
+            history.record_scan(conn, "my-env", [])
+
+        with StringIO() as buf, redirect_stdout(buf):
+            lib.search_history(history_path, "csv", since=since)
+            stdout = buf.getvalue()
+
+        assert stdout == expected
+
+    def test_history_db_not_writable(self, mock_all_errors, tmp_path):
+        history_path = tmp_path / "does-not-exist" / "history.db"
+        with patch("pip_abandoned.lib.get_repo_statuses") as mock:
+            with pytest.raises(Exception) as exc:
+                lib.search_virtualenv_path(
+                    "fake_token", "/fake/path", 0, history_path=history_path
+                )
+        assert "Couldn't open history database" in str(exc)
+        assert mock.call_count == 0
+
+    def test_forget_history(self, tmp_path):
+        history_path = tmp_path / "history.db"
+        with closing(history.open_db(history_path)) as conn:
+            history.record_scan(conn, "my-env (shard 3/3)", [("foo", None, "inactive")])
+            history.record_scan(conn, "my-env (shard 1/2)", [("bar", None, "inactive")])
+
+        with StringIO() as buf, redirect_stdout(buf):
+            assert lib.forget_history(history_path, "my-env (shard 3/3)") == 0
+            lib.search_history(history_path, "json")
+            stdout = buf.getvalue()
+
+        assert "Removed 1 search of my-env (shard 3/3)" in stdout
+        assert '"package": "foo"' not in stdout
+        assert '"package": "bar"' in stdout
+
+    def test_history_not_found(self, tmp_path):
+        with pytest.raises(Exception) as exc:
+            lib.search_history(tmp_path / "history.db")
+        assert "Couldn't find history database" in str(exc)
+
+    @responses.activate
+    def test_chunks_are_dispatched_while_reading_metadata(self, mock_all_errors):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_distributions(
+                "fake_token",
+                iter(mock_all_errors.return_value),
+                "json",
+                chunk_size=1,
+            )
+            stdout = buf.getvalue()
+
+        assert len(responses.calls) == 1
+        assert json.loads(stdout) == {
+            "inactive": ["inactive"],
+            "unmaintained": ["readme"],
+            "archived": ["home-page"],
+        }
+        assert exit_code == 9
+
+    @responses.activate
+    def test_fail_fast_stops_reading_metadata(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+
+        # The event the consumer sets when it finds an archived repo
+        stop = threading.Event()
+
+        def dists():
+            yield get_dist_fixture("home-page-1.0.0.dist-info")
+            assert stop.wait(timeout=10)
+            yield get_dist_fixture("inactive-1.0.0.dist-info")
+
+        with (
+            StringIO() as buf,
+            redirect_stdout(buf),
+            patch("pip_abandoned.lib.threading", wraps=threading) as mock_threading,
+        ):
+            mock_threading.Event.return_value = stop
+            exit_code = lib.search_distributions(
+                "fake_token", dists(), "json", fail_fast=True, chunk_size=1
+            )
+            stdout = buf.getvalue()
+
+        assert json.loads(stdout) == {
+            "inactive": [],
+            "unmaintained": [],
+            "archived": ["home-page"],
+        }
+        assert exit_code == 9
+
+    def test_consumer_errors_are_raised(self, mock_distributions_homepage):
+        with patch("pip_abandoned.lib.get_repo_statuses") as mock:
+            mock.side_effect = Exception("boom")
+            with pytest.raises(Exception) as exc:
+                lib.search_virtualenv_path("fake_token", "/fake/path", 0)
+        assert "boom" in str(exc)
+
+    def test_producer_errors_are_raised(self):
+        def dists():
+            yield get_dist_fixture("home-page-1.0.0.dist-info")
+            raise Exception("boom")
+
+        with pytest.raises(Exception) as exc:
+            lib.search_distributions("fake_token", dists(), chunk_size=1)
+        assert "boom" in str(exc)
+
+
+class TestSearchWheelhouse:
+    @responses.activate
+    def test_json_output(self, wheelhouse):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_home_page": {"isArchived": True}}},
+            status=200,
+        )
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.search_wheelhouse("fake_token", wheelhouse, 0, "json")
+            stdout = buf.getvalue()
+
+        assert json.loads(stdout) == {
+            "inactive": ["inactive"],
+            "unmaintained": ["readme"],
+            "archived": ["home-page"],
+        }
+        assert exit_code == 9
+
+    def test_no_packages(self, tmp_path):
+        with pytest.raises(Exception) as exc:
+            lib.search_wheelhouse("fake_token", tmp_path, 0)
+        assert f"Couldn't find any packages in {tmp_path}" in str(exc)
+
+
+class TestGetWheelhouseDistributions:
+    def test_wheels_and_sdists(self, wheelhouse):
+        dists = list(lib.get_wheelhouse_distributions(wheelhouse))
+        assert [d.name for d in dists] == ["home-page", "inactive", "readme"]
+        assert lib.is_inactive(dists[1])
+
+    def test_nested_directories(self, tmp_path):
+        (tmp_path / "ab" / "cd").mkdir(parents=True)
+        make_wheel(tmp_path / "ab" / "cd", "inactive")
+        dists = list(lib.get_wheelhouse_distributions(tmp_path))
+        assert [d.name for d in dists] == ["inactive"]
+
+    def test_duplicate_packages(self, tmp_path):
+        make_wheel(tmp_path, "inactive")
+        make_sdist(tmp_path, "inactive")
+        dists = list(lib.get_wheelhouse_distributions(tmp_path))
+        assert [d.name for d in dists] == ["inactive"]
+
+    def test_no_packages(self, tmp_path):
+        with pytest.raises(Exception) as exc:
+            list(lib.get_wheelhouse_distributions(tmp_path))
+        assert f"Couldn't find any packages in {tmp_path}" in str(exc)
+
+    def test_packages_are_yielded_while_reading(self, wheelhouse):
+        # Block reading every archive after the first one
+        # until we have already been given the first package
+        release = threading.Event()
+        read_archive_metadata = lib.read_archive_metadata
+
+        def blocking_read_archive_metadata(path):
+            if not path.name.startswith("home-page"):
+                assert release.wait(timeout=10)
+            return read_archive_metadata(path)
+
+        with patch(
+            "pip_abandoned.lib.read_archive_metadata",
+            wraps=blocking_read_archive_metadata,
+        ):
+            dists = lib.get_wheelhouse_distributions(wheelhouse)
+            assert next(dists).name == "home-page"
+            release.set()
+            assert [d.name for d in dists] == ["inactive", "readme"]
+
+    def test_wheel_metadata_must_be_in_dist_info(self, tmp_path):
+        path = tmp_path / "inactive-1.0.0-py3-none-any.whl"
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("inactive/METADATA", "not package metadata")
+            zf.write(
+                get_metadata_fixture("inactive-1.0.0.dist-info"),
+                "inactive-1.0.0.dist-info/METADATA",
+            )
+        dists = list(lib.get_wheelhouse_distributions(tmp_path))
+        assert [d.name for d in dists] == ["inactive"]
+
+    def test_invalid_archives_are_skipped(self, tmp_path):
+        make_wheel(tmp_path, "inactive")
+        (tmp_path / "broken-1.0.0-py3-none-any.whl").write_text("not a zip")
+        (tmp_path / "broken-1.0.0.tar.gz").write_text("not a tarball")
+        with zipfile.ZipFile(tmp_path / "empty-1.0.0-py3-none-any.whl", "w") as zf:
+            zf.writestr("empty/__init__.py", "")
+        with zipfile.ZipFile(tmp_path / "no_name-1.0.0-py3-none-any.whl", "w") as zf:
+            zf.writestr("no_name-1.0.0.dist-info/METADATA", "Version: 1.0.0\n")
+        dists = list(lib.get_wheelhouse_distributions(tmp_path))
+        assert [d.name for d in dists] == ["inactive"]
+
+
+class TestGetShards:
+    def test_packages_sharing_a_repo_stay_together(self):
+        dists = [
+            get_dist_fixture("home-page-1.0.0.dist-info"),
+            get_dist_fixture("project-urls-1.0.0.dist-info"),
+            get_dist_fixture("inactive-1.0.0.dist-info"),
+            get_dist_fixture("readme-1.0.0.dist-info"),
+        ]
+        dist_repos = [(dist, lib.get_github_repo_url(dist)) for dist in dists]
+        shards = lib.get_shards(dist_repos, 2)
+        assert [[d.name for d, _ in shard] for shard in shards] == [
+            ["home-page", "project-urls"],
+            ["inactive", "readme"],
+        ]
+
+    def test_more_shards_than_packages(self):
+        dist_repos = [(get_dist_fixture("inactive-1.0.0.dist-info"), None)]
+        shards = lib.get_shards(dist_repos, 3)
+        assert [[d.name for d, _ in shard] for shard in shards] == [
+            ["inactive"],
+            [],
+            [],
+        ]
+
+    def test_balanced_by_repo_count(self):
+        dist_repos = [
+            (SimpleNamespace(name=f"pkg{i}"), repo)
+            for i, repo in enumerate(
+                [
+                    "https://github.com/octocat/a",
+                    "https://github.com/octocat/b",
+                    "https://github.com/octocat/c",
+                    None,
+                    "https://github.com/octocat/d",
+                ]
+            )
+        ]
+        shards = lib.get_shards(dist_repos, 2)
+        assert [[d.name for d, _ in shard] for shard in shards] == [
+            ["pkg0", "pkg2", "pkg3"],
+            ["pkg1", "pkg4"],
+        ]
+
+    def test_independent_of_input_order(self):
+        dist_repos = [
+            (SimpleNamespace(name=f"pkg{i}"), repo)
+            for i, repo in enumerate(
+                [
+                    "https://github.com/octocat/a",
+                    "https://github.com/octocat/b",
+                    "https://github.com/octocat/b",
+                    None,
+                    None,
+                    "https://github.com/octocat/c",
+                    "https://github.com/octocat/d",
+                ]
+            )
+        ]
+        expected = [
+            [d.name for d, _ in shard] for shard in lib.get_shards(dist_repos, 3)
+        ]
+        for shuffled in (list(reversed(dist_repos)), dist_repos[3:] + dist_repos[:3]):
+            shards = lib.get_shards(shuffled, 3)
+            assert [[d.name for d, _ in shard] for shard in shards] == expected
+
+
+def test_plan_repo_index(mock_all_errors, tmp_path):
+    index_path = tmp_path / "repo-index.txt"
+    write_repo_index(index_path, {"inactive": "octocat/inactive"})
+    with StringIO() as buf, redirect_stdout(buf):
+        exit_code = lib.plan_virtualenv_path("/fake/path", 1, 0, index_path)
+        stdout = buf.getvalue()
+
+    assert {"name": "inactive", "repo": "https://github.com/octocat/inactive"} in (
+        json.loads(stdout)[0]["packages"]
+    )
+    assert exit_code == 0
+
+
+def test_merge_reports():
+    reports = [
+        {"inactive": ["foo"], "unmaintained": [], "archived": ["bar"]},
+        {"inactive": [], "unmaintained": ["baz"], "archived": ["bar", "qux"]},
+    ]
+    assert lib.merge_reports(reports) == {
+        "inactive": ["foo"],
+        "unmaintained": ["baz"],
+        "archived": ["bar", "qux"],
+    }
+
+
+class TestGetDeprecationSignals:
+    @pytest.mark.parametrize(
+        "description,expected",
+        [
+            (
+                "![](https://img.shields.io/maintenance/no/2023)",
+                ["[maintained|no] badge"],
+            ),
+            (
+                "![](https://img.shields.io/badge/maintained-no-red.svg)",
+                ["unmaintained badge"],
+            ),
+            ("![](https://badgen.net/badge/maintained/no/red)", ["unmaintained badge"]),
+            (
+                "![](https://www.repostatus.org/badges/latest/abandoned.svg)",
+                ["repostatus badge"],
+            ),
+            ("This project is NO LONGER MAINTAINED.", ["no longer maintained"]),
+            ("This package has been deprecated.", ["deprecated notice"]),
+            ("This project has moved to foo/bar", ["moved notice"]),
+            (
+                "# Deprecated\n\nThis library is deprecated. "
+                "This library is no longer maintained.",
+                ["deprecated notice", "no longer maintained"],
+            ),
+            (
+                "This library is deprecated and no longer maintained.",
+                ["no longer maintained"],
+            ),
+            ("This package is no longer actively maintained", ["no longer maintained"]),
+            (
+                "This project has moved to https://github.com/foo/bar",
+                ["moved notice"],
+            ),
+            (
+                "This repo has moved to [foo/bar](https://github.com/foo/bar)",
+                ["moved notice"],
+            ),
+            ("This package has been moved to the `foo-bar` package", ["moved notice"]),
+            ("![](https://img.shields.io/maintenance/yes/2026)", []),
+            ("This function has moved to another module", []),
+            ("A maintained fork of foo, which is no longer maintained", []),
+            ("Python 2 support is no longer maintained", []),
+            ("The 1.x branch is no longer actively maintained", []),
+            ("This project has moved to GitHub Actions for CI", []),
+            ("This project has moved to a new home", []),
+            ("", []),
+        ],
+    )
+    def test_default_patterns(self, description, expected):
+        dist = SimpleNamespace(metadata={"Description": description})
+        assert lib.get_deprecation_signals(dist) == expected
+
+    def test_readme_fixture(self):
+        dist = get_dist_fixture("readme-1.0.0.dist-info")
+        assert lib.get_deprecation_signals(dist) == ["[maintained|no] badge"]
+
+    def test_custom_patterns(self):
+        matcher = lib.compile_deprecation_patterns(
+            {"dead": r"\bdead\b", "badge": r"//img\.shields\.io/maintenance/no"}
+        )
+        dist = get_dist_fixture("readme-1.0.0.dist-info")
+        assert lib.get_deprecation_signals(dist, matcher) == ["badge", "dead"]
+
+    def test_inline_flags(self):
+        matcher = lib.compile_deprecation_patterns(
+            {**lib.DEPRECATION_PATTERNS, "dead": r"(?s)(?x) this \s package .* dead"}
+        )
+        dist = SimpleNamespace(metadata={"Description": "This package\nis dead"})
+        assert lib.get_deprecation_signals(dist, matcher) == ["dead"]
+
+    def test_named_backreferences(self):
+        matcher = lib.compile_deprecation_patterns(
+            {**lib.DEPRECATION_PATTERNS, "stutter": r"(?P<un>un)(?P=un)maintained"}
+        )
+        dist = SimpleNamespace(metadata={"Description": "ununmaintained"})
+        assert lib.get_deprecation_signals(dist, matcher) == ["stutter"]
+
+    @pytest.mark.parametrize(
+        "pattern", [r"(un)\1maintained", r"(a)?(?(1)b|c)", r"\\\1"]
+    )
+    def test_numbered_backreferences(self, pattern):
+        with pytest.raises(Exception) as exc:
+            lib.compile_deprecation_patterns({"bad": pattern})
+        assert "Numbered backreferences are not supported" in str(exc)
+
+    @pytest.mark.parametrize("pattern", [r"\\1", r"[0-9]\d"])
+    def test_not_numbered_backreferences(self, pattern):
+        lib.compile_deprecation_patterns({"ok": pattern})
+
+
+@pytest.fixture
+def repo_index(tmp_path):
+    path = tmp_path / "repo-index.txt"
+    write_repo_index(
+        path,
+        {
+            "inactive": "octocat/inactive",
+            "multiple-matches": "chris48s/completely-different-repo",
+            "home-page": "octocat/something-else",
+        },
+    )
+    return RepoIndex(path)
+
 
 class TestGetGitHubRepo:
     def test_no_matches(self):
         dist = get_dist_fixture("inactive-1.0.0.dist-info")
         assert lib.get_github_repo_url(dist) is None
 
+    def test_no_matches_index_fallback(self, repo_index):
+        dist = get_dist_fixture("inactive-1.0.0.dist-info")
+        expected = "https://github.com/octocat/inactive"
+        assert lib.get_github_repo_url(dist, repo_index) == expected
+
+    def test_multiple_matches_index_tie_break(self, repo_index):
+        dist = get_dist_fixture("multiple-matches-1.0.0.dist-info")
+        expected = "https://github.com/chris48s/completely-different-repo"
+        assert lib.get_github_repo_url(dist, repo_index) == expected
+
+    def test_metadata_takes_precedence_over_index(self, repo_index):
+        dist = get_dist_fixture("home-page-1.0.0.dist-info")
+        expected = "https://github.com/chris48s/does-not-exist"
+        assert lib.get_github_repo_url(dist, repo_index) == expected
+
     def test_home_page_match(self):
         dist = get_dist_fixture("home-page-1.0.0.dist-info")
         expected = "https://github.com/chris48s/does-not-exist"
@@ -333,6 +1046,534 @@ class TestGetGraphqlQueries:
         assert "_spoon_knife5" in queries[0]
 
 
+class TestGetRepoStatuses:
+    @property
+    def dist_urls(self):
+        return [
+            (
+                SimpleNamespace(name="Spoon-Knife"),
+                "https://github.com/octocat/Spoon-Knife",
+            ),
+            (
+                SimpleNamespace(name="Hello-World"),
+                "https://github.com/octocat/Hello-World",
+            ),
+        ]
+
+    @responses.activate
+    def test_no_cache(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={
+                "data": {
+                    "_spoon_knife": {"isArchived": True},
+                    "_hello_world": {"isArchived": False},
+                }
+            },
+            status=200,
+        )
+
+        results = lib.get_repo_statuses("fake_token", self.dist_urls)
+
+        assert results == {
+            "_spoon_knife": {"isArchived": True},
+            "_hello_world": {"isArchived": False},
+        }
+
+    @responses.activate
+    def test_fresh_repos_are_cached(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={
+                "data": {
+                    "_spoon_knife": {"id": "R_1", "isArchived": True},
+                    "_hello_world": None,
+                }
+            },
+            status=200,
+        )
+        cache = {}
+
+        lib.get_repo_statuses("fake_token", self.dist_urls, cache)
+
+        assert cache == {"octocat/spoon-knife": {"isArchived": True, "id": "R_1"}}
+
+    @responses.activate
+    def test_cached_repos_are_revalidated(self):
+        responses.add(
+            responses.GET,
+            "https://api.github.com/repos/octocat/spoon-knife",
+            status=304,
+            match=[responses.matchers.header_matcher({"If-None-Match": '"abc"'})],
+        )
+        responses.add(
+            responses.GET,
+            "https://api.github.com/repos/octocat/hello-world",
+            json={"archived": True, "node_id": "R_2"},
+            headers={"ETag": '"def"'},
+            status=200,
+        )
+        cache = {
+            "octocat/spoon-knife": {"isArchived": False, "etag": '"abc"'},
+            "octocat/hello-world": {"isArchived": False},
+        }
+
+        results = lib.get_repo_statuses("fake_token", self.dist_urls, cache)
+
+        assert results == {
+            "_spoon_knife": {"isArchived": False, "etag": '"abc"'},
+            "_hello_world": {"isArchived": True, "etag": '"def"', "id": "R_2"},
+        }
+        assert cache == {
+            "octocat/spoon-knife": {"isArchived": False, "etag": '"abc"'},
+            "octocat/hello-world": {"isArchived": True, "etag": '"def"', "id": "R_2"},
+        }
+
+    @responses.activate
+    def test_deleted_repos_are_evicted(self):
+        responses.add(
+            responses.GET,
+            "https://api.github.com/repos/octocat/spoon-knife",
+            status=404,
+        )
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_hello_world": {"id": "R_2", "isArchived": False}}},
+            status=200,
+        )
+        cache = {"octocat/spoon-knife": {"isArchived": True, "etag": '"abc"'}}
+
+        results = lib.get_repo_statuses("fake_token", self.dist_urls, cache)
+
+        assert results == {
+            "_spoon_knife": None,
+            "_hello_world": {"id": "R_2", "isArchived": False},
+        }
+        assert cache == {"octocat/hello-world": {"isArchived": False, "id": "R_2"}}
+
+    @responses.activate
+    def test_fail_fast_stops_after_first_archived_chunk(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_spoon_knife": {"isArchived": True}}},
+            status=200,
+        )
+
+        with patch("pip_abandoned.lib.DEFAULT_CHUNK_SIZE", 1):
+            results = lib.get_repo_statuses(
+                "fake_token", self.dist_urls, fail_fast=True
+            )
+
+        assert len(responses.calls) == 1
+        assert results == {"_spoon_knife": {"isArchived": True}}
+
+    @responses.activate
+    def test_fail_fast_skips_graphql_after_archived_cached_repo(self):
+        responses.add(
+            responses.GET,
+            "https://api.github.com/repos/octocat/spoon-knife",
+            json={"archived": True},
+            status=200,
+        )
+        cache = {"octocat/spoon-knife": {"isArchived": False}}
+
+        results = lib.get_repo_statuses(
+            "fake_token", self.dist_urls, cache, fail_fast=True
+        )
+
+        assert len(responses.calls) == 1
+        assert results == {
+            "_spoon_knife": {"isArchived": True, "etag": None, "id": None}
+        }
+
+    @responses.activate
+    def test_revalidate_by_node_id(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={
+                "data": {
+                    "nodes": [
+                        None,
+                        {"id": "R_1", "isArchived": True},
+                    ]
+                }
+            },
+            status=200,
+            match=[
+                responses.matchers.json_params_matcher(
+                    {"query": lib.get_nodes_query(["R_2", "R_1"])}
+                )
+            ],
+        )
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_third": {"id": "R_3", "isArchived": False}}},
+            status=200,
+        )
+        dist_urls = self.dist_urls + [
+            (SimpleNamespace(name="third"), "https://github.com/octocat/third")
+        ]
+        cache = {
+            "octocat/spoon-knife": {"isArchived": False, "id": "R_1"},
+            "octocat/hello-world": {"isArchived": False, "id": "R_2"},
+            # no node ID yet, so this is looked up by owner/name
+            "octocat/third": {"isArchived": False, "etag": '"abc"'},
+        }
+
+        results = lib.get_repo_statuses(
+            "fake_token", dist_urls, cache, revalidate="nodes"
+        )
+
+        assert len(responses.calls) == 2
+        assert results == {
+            "_spoon_knife": {"isArchived": True, "id": "R_1"},
+            "_hello_world": None,
+            "_third": {"id": "R_3", "isArchived": False},
+        }
+        assert cache == {
+            "octocat/spoon-knife": {"isArchived": True, "id": "R_1"},
+            "octocat/third": {"isArchived": False, "id": "R_3"},
+        }
+
+    @responses.activate
+    def test_revalidate_by_node_id_fail_fast(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"nodes": [{"id": "R_2", "isArchived": True}]}},
+            status=200,
+        )
+        cache = {
+            "octocat/spoon-knife": {"isArchived": False, "id": "R_1"},
+            "octocat/hello-world": {"isArchived": False, "id": "R_2"},
+        }
+
+        with patch("pip_abandoned.lib.DEFAULT_NODES_CHUNK_SIZE", 1):
+            results = lib.get_repo_statuses(
+                "fake_token", self.dist_urls, cache, True, "nodes"
+            )
+
+        assert len(responses.calls) == 1
+        assert results == {"_hello_world": {"isArchived": True, "id": "R_2"}}
+
+
+class TestGetNodesQueries:
+    def test_chunks(self):
+        ids = [f"R_{i}" for i in range(5)]
+        queries = lib.get_nodes_queries(ids, 2)
+        assert [chunk for chunk, _ in queries] == [
+            ["R_0", "R_1"],
+            ["R_2", "R_3"],
+            ["R_4"],
+        ]
+        assert queries[0][1] == (
+            "query {\n"
+            '  nodes(ids: ["R_0", "R_1"]) { ... on Repository { id isArchived } }\n'
+            "}"
+        )
+
+
+class TestCache:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "pip-abandoned" / "repos.json"
+        cache = {"octocat/spoon-knife": {"isArchived": True, "etag": '"abc"'}}
+        lib.save_cache(path, cache)
+        assert lib.load_cache(path) == cache
+
+    def test_missing_file(self, tmp_path):
+        assert lib.load_cache(tmp_path / "repos.json") == {}
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / "repos.json"
+        path.write_text("not json")
+        assert lib.load_cache(path) == {}
+
+
+class TestTokenPool:
+    def test_unknown_budget_first(self):
+        pool = lib.TokenPool(["a", "b"])
+        pool.update("a", {"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "2000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert pool.acquire() == "b"
+
+    def test_most_remaining_budget(self):
+        pool = lib.TokenPool(["a", "b", "c"])
+        pool.update("a", {"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "2000"})
+        pool.update("b", {"X-RateLimit-Remaining": "300", "X-RateLimit-Reset": "2000"})
+        pool.update("c", {"X-RateLimit-Remaining": "200", "X-RateLimit-Reset": "2000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert pool.acquire() == "b"
+
+    def test_concurrent_requests_are_spread(self):
+        pool = lib.TokenPool(["a", "b"])
+        pool.update("a", {"X-RateLimit-Remaining": "2", "X-RateLimit-Reset": "2000"})
+        pool.update("b", {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "2000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert [pool.acquire() for _ in range(3)] == ["a", "a", "b"]
+
+    def test_exhausted_token_comes_back_after_reset(self):
+        pool = lib.TokenPool(["a", "b"])
+        pool.update("a", {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "2000"})
+        pool.update("b", {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "5000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert pool.acquire() == "b"
+        with patch("pip_abandoned.lib.time.time", return_value=2000):
+            assert pool.acquire() == "a"
+
+    def test_all_exhausted(self):
+        pool = lib.TokenPool(["a", "b"])
+        pool.update("a", {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "2000"})
+        pool.update("b", {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "3000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            with pytest.raises(Exception) as exc:
+                pool.acquire()
+        assert "rate limit exceeded for all tokens" in str(exc)
+
+    def test_missing_headers(self):
+        pool = lib.TokenPool(["a"])
+        pool.update("a", {})
+        assert pool.remaining == {}
+
+    def test_budgets_are_per_resource(self):
+        pool = lib.TokenPool(["a", "b"])
+        pool.update(
+            "a",
+            {
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": "2000",
+                "X-RateLimit-Resource": "graphql",
+            },
+        )
+        pool.update(
+            "b",
+            {
+                "X-RateLimit-Remaining": "10",
+                "X-RateLimit-Reset": "2000",
+                "X-RateLimit-Resource": "graphql",
+            },
+        )
+        # a 304 from the REST API doesn't tell us anything about graphql
+        pool.update(
+            "a",
+            {
+                "X-RateLimit-Remaining": "5000",
+                "X-RateLimit-Reset": "2000",
+                "X-RateLimit-Resource": "core",
+            },
+        )
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert pool.acquire("graphql") == "b"
+            assert pool.acquire("core") == "b"
+        pool.update("b", {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "2000"})
+        with patch("pip_abandoned.lib.time.time", return_value=1000):
+            assert pool.acquire("core") == "a"
+
+    @responses.activate
+    def test_rest_responses_dont_update_graphql_budget(self):
+        responses.add(
+            responses.GET,
+            "https://api.github.com/repos/octocat/foo",
+            status=304,
+            headers={
+                "X-RateLimit-Remaining": "5000",
+                "X-RateLimit-Reset": "9999999999",
+                "X-RateLimit-Resource": "core",
+            },
+        )
+        pool = lib.TokenPool(["a", "b"])
+        pool.update(
+            "a",
+            {
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": "9999999999",
+                "X-RateLimit-Resource": "graphql",
+            },
+        )
+        lib.github_request(pool, "GET", "https://api.github.com/repos/octocat/foo")
+        assert pool.acquire("graphql") == "b"
+
+    @responses.activate
+    @pytest.mark.parametrize(
+        "body,status",
+        [
+            (
+                {
+                    "data": None,
+                    "errors": [
+                        {
+                            "type": "RATE_LIMITED",
+                            "message": "API rate limit exceeded for user ID 1.",
+                        }
+                    ],
+                },
+                200,
+            ),
+            ({"message": "API rate limit exceeded"}, 403),
+        ],
+    )
+    def test_rotates_when_rate_limited(self, body, status):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json=body,
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999"},
+            status=status,
+            match=[responses.matchers.header_matcher({"Authorization": "token a"})],
+        )
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": {"_foo": {"isArchived": True}}},
+            headers={
+                "X-RateLimit-Remaining": "4999",
+                "X-RateLimit-Reset": "9999999999",
+            },
+            status=200,
+            match=[responses.matchers.header_matcher({"Authorization": "token b"})],
+        )
+        pool = lib.TokenPool(["a", "b"])
+
+        assert lib.query_github_api(pool, "query {}") == {"_foo": {"isArchived": True}}
+        assert pool.remaining == {("a", "graphql"): 0, ("b", "graphql"): 4999}
+        assert pool.acquire("graphql") == "b"
+
+
+class TestIsRateLimited:
+    @responses.activate
+    @pytest.mark.parametrize(
+        "body,status,remaining,expected",
+        [
+            ({"errors": [{"type": "RATE_LIMITED"}]}, 200, "0", True),
+            ({"message": "API rate limit exceeded"}, 403, "0", True),
+            # the last request of the budget succeeded
+            ({"data": {"_foo": {"isArchived": False}}}, 200, "0", False),
+            ({"errors": [{"type": "NOT_FOUND"}]}, 200, "0", False),
+            ({"message": "Forbidden"}, 403, "10", False),
+        ],
+    )
+    def test_is_rate_limited(self, body, status, remaining, expected):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json=body,
+            headers={"X-RateLimit-Remaining": remaining},
+            status=status,
+        )
+        resp = requests.post("https://api.github.com/graphql")
+        assert lib.is_rate_limited(resp) is expected
+
+    @responses.activate
+    def test_all_tokens_rate_limited(self):
+        responses.add(
+            responses.POST,
+            "https://api.github.com/graphql",
+            json={"data": None, "errors": [{"type": "RATE_LIMITED"}]},
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999"},
+            status=200,
+        )
+        with pytest.raises(Exception) as exc:
+            lib.query_github_api(lib.TokenPool(["a", "b"]), "query {}")
+        assert "RATE_LIMITED" in str(exc)
+
+
+class TestGetTokens:
+    def test_env(self, monkeypatch):
+        monkeypatch.setenv("GH_TOKEN", "abc")
+        assert lib.get_tokens() == ["abc"]
+
+    def test_env_multiple(self, monkeypatch):
+        monkeypatch.setenv("GH_TOKEN", "abc, def,ghi")
+        assert lib.get_tokens() == ["abc", "def", "ghi"]
+
+    @pytest.mark.parametrize("value", [" , ", ","])
+    def test_env_no_tokens(self, monkeypatch, value):
+        monkeypatch.setenv("GH_TOKEN", value)
+        with pytest.raises(Exception) as exc:
+            lib.get_tokens()
+        assert "No GitHub token supplied" in str(exc)
+
+    def test_keyring(self, monkeypatch):
+        monkeypatch.delenv("GH_TOKEN", raising=False)
+        passwords = {"gh_token": "abc", "gh_token_2": "def", "gh_token_3": "ghi"}
+        with patch("pip_abandoned.lib.keyring.get_password") as mock:
+            mock.side_effect = lambda _, username: passwords.get(username)
+            assert lib.get_tokens() == ["abc", "def", "ghi"]
+
+    def test_no_tokens(self, monkeypatch):
+        monkeypatch.delenv("GH_TOKEN", raising=False)
+        with patch("pip_abandoned.lib.keyring.get_password") as mock:
+            mock.return_value = None
+            with pytest.raises(Exception) as exc:
+                lib.get_tokens()
+        assert "No GitHub token supplied" in str(exc)
+
+
+class TestSetToken:
+    @pytest.fixture
+    def passwords(self):
+        passwords = {"gh_token": "abc", "gh_token_2": "def", "gh_token_3": "ghi"}
+        with patch("pip_abandoned.lib.keyring") as mock:
+            mock.get_password.side_effect = lambda _, username: passwords.get(username)
+            mock.set_password.side_effect = lambda _, username, token: (
+                passwords.__setitem__(username, token)
+            )
+            mock.delete_password.side_effect = lambda _, username: passwords.pop(
+                username
+            )
+            yield passwords
+
+    def test_replace(self, passwords):
+        with (
+            patch("builtins.input", return_value="xyz"),
+            patch("pip_abandoned.lib.console"),
+        ):
+            assert lib.set_token() == 0
+        assert passwords == {"gh_token": "xyz"}
+        assert lib.get_keyring_tokens() == ["xyz"]
+
+    def test_add(self, passwords):
+        with (
+            patch("builtins.input", return_value="xyz"),
+            patch("pip_abandoned.lib.console"),
+        ):
+            assert lib.set_token(add=True) == 0
+        assert lib.get_keyring_tokens() == ["abc", "def", "ghi", "xyz"]
+
+
+class TestBuildRepoIndex:
+    def test_from_history_and_metadata(self, tmp_path, wheelhouse):
+        history_path = tmp_path / "history.db"
+        with closing(history.open_db(history_path)) as conn:
+            history.record_scan(
+                conn,
+                "my-env",
+                [
+                    ("commonmark", "readthedocs/commonmark.py", "archived"),
+                    ("home-page", "octocat/old-name", "archived"),
+                ],
+            )
+        output = tmp_path / "repo-index.txt"
+
+        with StringIO() as buf, redirect_stdout(buf):
+            exit_code = lib.build_repo_index(
+                output,
+                history_paths=[history_path],
+                wheelhouses=[wheelhouse],
+            )
+
+        assert exit_code == 0
+        index = RepoIndex(output)
+        assert index.lookup("commonmark") == "readthedocs/commonmark.py"
+        assert index.lookup("home-page") == "chris48s/does-not-exist"
+        assert index.lookup("inactive") is None
+
+
 def test_merge_results():
     input_ = [{"a": 1, "b": 2}, {"c": 3, "d": 4}]
     expected = {
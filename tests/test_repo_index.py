@@ -0,0 +1,50 @@
+import pytest
+
+from pip_abandoned.repo_index import HEADER, RepoIndex, write_repo_index
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = tmp_path / "repo-index.txt"
+    write_repo_index(
+        path,
+        {f"package-{i:03}": f"owner/repo-{i:03}" for i in range(100)}
+        | {"Foo.Bar": "octocat/foo-bar"},
+    )
+    return path
+
+
+def test_file_format(tmp_path):
+    path = tmp_path / "repo-index.txt"
+    assert write_repo_index(path, {"b": "octocat/b", "A-A": "octocat/a"}) == 2
+    assert path.read_bytes() == HEADER + b"a_a\toctocat/a\nb\toctocat/b\n"
+
+
+@pytest.mark.parametrize("i", [0, 1, 49, 50, 98, 99])
+def test_lookup(index_path, i):
+    assert RepoIndex(index_path).lookup(f"package-{i:03}") == f"owner/repo-{i:03}"
+
+
+def test_lookup_normalizes_name(index_path):
+    assert RepoIndex(index_path).lookup("foo_bar") == "octocat/foo-bar"
+
+
+@pytest.mark.parametrize("name", ["package-100", "aaa", "zzz", "package", "foo"])
+def test_not_found(index_path, name):
+    assert RepoIndex(index_path).lookup(name) is None
+
+
+def test_empty_index(tmp_path):
+    path = tmp_path / "repo-index.txt"
+    write_repo_index(path, {})
+    assert RepoIndex(path).lookup("foo") is None
+
+
+def test_missing_file(tmp_path):
+    assert RepoIndex(tmp_path / "repo-index.txt").lookup("foo") is None
+
+
+def test_unsupported_version(tmp_path):
+    path = tmp_path / "repo-index.txt"
+    path.write_bytes(b"# pip-abandoned repo index v999\nfoo\toctocat/foo\n")
+    assert RepoIndex(path).lookup("foo") is None